@@ -19,6 +19,7 @@ class Config:
             'time_src_image': 'exif,name',
             'time_src_video': 'exif,name,attr',
             'time_src_audio': 'exif,name,attr',
+            'name_fast_path': 0,
             'file_ext_image': 'jpeg,jpg',
             'file_ext_video': 'mp4,mpg,mpeg,mov,avi,mts,m2ts,3gp,m4v',
             'file_ext_audio': 'mp3,3gpp,m4a,wav,aac',
@@ -30,9 +31,27 @@ class Config:
             'threads_count': 2,
             'umask': '0o000',
             'use_jpegtran': 0,
+            'use_turbojpeg': 0,
             'use_shutil': 0,
+            'use_native_copy': 0,
+            'copy_buffer_size': 1048576,
+            'copy_workers': 1,
+            'copy_src_device_limit': 0,
+            'copy_dst_device_limit': 0,
+            'use_native_exif': 0,
             'add_orig_name': 0,
             'time_shift': 0,
+            'exif_batch_size': 100,
+            'exif_workers': 1,
+            'pipeline': 0,
+            'stream_scan': 0,
+            'scan_sorted': 1,
+            'use_cache': 0,
+            'cache_file': '~/.cache/photo-importer/metadata.db',
+            'cache_size': 100000,
+            'log_max_lines': 10000,
+            'journal': 0,
+            'journal_file': '.photo-importer.journal',
         },
         'server': {
             'host': '',
@@ -41,6 +60,14 @@ class Config:
             'out_path': '/mnt/multimedia/NEW/',
             'in_path': '',
             'log_file': 'photo-importer-server.log',
+            'events_interval': 1,
+            'devices_interval': 5,
+            'folder_size_ttl': 60,
+            'auto_import': 0,
+            'sysinfo_interval': 1,
+            'sysinfo_history': 60,
+            'max_imports': 2,
+            'max_imports_per_device': 1,
         },
     }
 
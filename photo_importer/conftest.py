@@ -7,9 +7,11 @@ from photo_importer import fileprop
 
 
 @pytest.fixture
-def cfg():
+def cfg(tmp_path):
     """A Config built only from defaults — never reads host config files."""
-    return config.Config(use_system_config=False)
+    c = config.Config(use_system_config=False)
+    c.set('main', 'cache_file', str(tmp_path / 'cache' / 'metadata.db'))
+    return c
 
 
 class _FakeExifTool:
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+
+import os
+import errno
+import shutil
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux ioctl to share file extents (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# The kernel-side copy is not possible for these files, try the next method
+UNSUPPORTED_ERRORS = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.ENOTSOCK,
+    errno.EPERM,
+)
+
+
+def copy(src, dst, buffer_size=DEFAULT_BUFFER_SIZE):
+    """Copy data, mode and timestamps like `cp -a`, return the used method.
+
+    Methods are tried in order: reflink (FICLONE), copy_file_range,
+    sendfile and a plain buffered copy.
+    """
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            method = _copy_data(fsrc.fileno(), fdst.fileno(), size, buffer_size)
+        shutil.copystat(src, dst)
+    except BaseException:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
+
+    logging.debug('copy (%s): %s -> %s', method, src, dst)
+    return method
+
+
+def _copy_data(src_fd, dst_fd, size, buffer_size):
+    if _reflink(src_fd, dst_fd):
+        return 'reflink'
+
+    offset = 0
+    for method, func in (('copy_file_range', _copy_file_range), ('sendfile', _sendfile)):
+        offset, done = func(src_fd, dst_fd, offset, size)
+        if done:
+            return method
+
+    _buffered(src_fd, dst_fd, offset, buffer_size)
+    return 'buffer'
+
+
+def _reflink(src_fd, dst_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as ex:
+        if ex.errno not in UNSUPPORTED_ERRORS:
+            raise
+        return False
+
+
+def _copy_file_range(src_fd, dst_fd, offset, size):
+    if not hasattr(os, 'copy_file_range'):
+        return offset, False
+    try:
+        while offset < size:
+            copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+            if copied == 0:  # the file was truncated meanwhile
+                break
+            offset += copied
+    except OSError as ex:
+        if ex.errno not in UNSUPPORTED_ERRORS:
+            raise
+        return offset, False
+    return offset, True
+
+
+def _sendfile(src_fd, dst_fd, offset, size):
+    if not hasattr(os, 'sendfile'):
+        return offset, False
+    try:
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        while offset < size:
+            sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+    except OSError as ex:
+        if ex.errno not in UNSUPPORTED_ERRORS:
+            raise
+        return offset, False
+    return offset, True
+
+
+def _buffered(src_fd, dst_fd, offset, buffer_size):
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    buf = memoryview(bytearray(buffer_size))
+    with open(src_fd, 'rb', buffering=0, closefd=False) as fsrc:
+        with open(dst_fd, 'wb', buffering=0, closefd=False) as fdst:
+            while True:
+                count = fsrc.readinto(buf)
+                if not count:
+                    break
+                written = 0
+                while written < count:
+                    written += fdst.write(buf[written:count])
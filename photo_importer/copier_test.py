@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+# pylint: disable=redefined-outer-name,unused-argument
+
+import os
+import errno
+
+import pytest
+
+from photo_importer import copier
+
+DATA = bytes(range(256)) * 1000
+
+
+@pytest.fixture
+def src(tmp_path):
+    p = tmp_path / 'src.jpg'
+    p.write_bytes(DATA)
+    os.chmod(p, 0o640)
+    os.utime(p, ns=(1590969600123456789, 1590969600123456789))
+    return str(p)
+
+
+def _unsupported(*args):
+    raise OSError(errno.EXDEV, 'not supported')
+
+
+def _check_copy(src, dst):
+    with open(dst, 'rb') as f:
+        assert f.read() == DATA
+    st_src = os.stat(src)
+    st_dst = os.stat(dst)
+    assert st_dst.st_mode == st_src.st_mode
+    assert st_dst.st_mtime_ns == st_src.st_mtime_ns
+
+
+def test_copy_keeps_data_and_attrs(tmp_path, src):
+    dst = str(tmp_path / 'dst.jpg')
+    assert copier.copy(src, dst) in ('reflink', 'copy_file_range', 'sendfile', 'buffer')
+    _check_copy(src, dst)
+
+
+def test_sendfile_fallback(tmp_path, src, monkeypatch):
+    monkeypatch.setattr(copier, 'fcntl', None)
+    monkeypatch.setattr(copier.os, 'copy_file_range', _unsupported, raising=False)
+    if not hasattr(os, 'sendfile'):
+        pytest.skip('no sendfile')
+
+    dst = str(tmp_path / 'dst.jpg')
+    assert copier.copy(src, dst) == 'sendfile'
+    _check_copy(src, dst)
+
+
+def test_buffered_fallback(tmp_path, src, monkeypatch):
+    monkeypatch.setattr(copier, 'fcntl', None)
+    monkeypatch.setattr(copier.os, 'copy_file_range', _unsupported, raising=False)
+    monkeypatch.setattr(copier.os, 'sendfile', _unsupported, raising=False)
+
+    dst = str(tmp_path / 'dst.jpg')
+    assert copier.copy(src, dst, buffer_size=1000) == 'buffer'
+    _check_copy(src, dst)
+
+
+def test_buffered_continues_partial_copy(tmp_path, src, monkeypatch):
+    calls = []
+
+    def copy_file_range(src_fd, dst_fd, count, offset_src, offset_dst):
+        if calls:
+            raise OSError(errno.EINVAL, 'not supported')
+        calls.append(count)
+        os.lseek(src_fd, offset_src, os.SEEK_SET)
+        os.lseek(dst_fd, offset_dst, os.SEEK_SET)
+        return os.write(dst_fd, os.read(src_fd, 1000))
+
+    monkeypatch.setattr(copier, 'fcntl', None)
+    monkeypatch.setattr(copier.os, 'copy_file_range', copy_file_range, raising=False)
+    monkeypatch.setattr(copier.os, 'sendfile', _unsupported, raising=False)
+
+    dst = str(tmp_path / 'dst.jpg')
+    assert copier.copy(src, dst, buffer_size=4096) == 'buffer'
+    _check_copy(src, dst)
+
+
+def test_empty_file(tmp_path):
+    src = tmp_path / 'empty.jpg'
+    src.write_bytes(b'')
+    dst = tmp_path / 'dst.jpg'
+
+    copier.copy(str(src), str(dst))
+
+    assert dst.read_bytes() == b''
+
+
+def test_failed_copy_removes_destination(tmp_path, src, monkeypatch):
+    def no_space(*args):
+        raise OSError(errno.ENOSPC, 'no space')
+
+    monkeypatch.setattr(copier, 'fcntl', None)
+    monkeypatch.setattr(copier.os, 'copy_file_range', no_space, raising=False)
+
+    dst = tmp_path / 'dst.jpg'
+    with pytest.raises(OSError):
+        copier.copy(src, str(dst))
+    assert not dst.exists()
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# pylint: disable=import-outside-toplevel,import-error
+
+import os
+import re
+import glob
+import select
+import socket
+import logging
+import threading
+
+import psutil
+
+
+FIXED_IN_PATH_NAME = 'none'
+
+MOUNTINFO = '/proc/self/mountinfo'
+
+# Kernel uevents of added and removed block devices
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+
+
+def _mounted_list():
+    return {os.path.basename(dp.device): (dp.device, dp.mountpoint) for dp in psutil.disk_partitions()}
+
+
+def _probe_posix():
+    mount_list = _mounted_list()
+    res = {}
+    for path in glob.glob('/sys/block/*/device'):
+        dev = re.sub(r'.*/(.*?)/device', r'\g<1>', path)
+        with open(f'/sys/block/{dev}/removable', encoding='utf-8') as f:
+            if f.read(1) != '1':
+                continue
+        read_only = False
+        with open(f'/sys/block/{dev}/ro', encoding='utf-8') as f:
+            if f.read(1) == '1':
+                read_only = True
+        for ppath in glob.glob(f'/sys/block/{dev}/{dev}*'):
+            pdev = os.path.split(ppath)[1]
+            if pdev in mount_list:
+                res[pdev] = {
+                    'dev_path': mount_list[pdev][0],
+                    'mount_path': mount_list[pdev][1],
+                    'read_only': read_only,
+                }
+            else:
+                res[pdev] = {
+                    'dev_path': '/dev/' + pdev,
+                    'mount_path': '',
+                    'read_only': read_only,
+                }
+
+    return res
+
+
+def _probe_win():  # pragma: no cover
+    import win32api
+    import win32con
+    import win32file
+
+    res = {}
+    for d in win32api.GetLogicalDriveStrings().split('\x00'):
+        if d and win32file.GetDriveType(d) == win32con.DRIVE_REMOVABLE:
+            dev_name = FIXED_IN_PATH_NAME + d
+            res[dev_name] = {
+                'dev_path': dev_name,
+                'mount_path': d,
+                'read_only': not os.access(d, os.W_OK),
+            }
+    return res
+
+
+def probe():
+    """Removable devices: {name: {'dev_path', 'mount_path', 'read_only'}}."""
+    if os.name == 'nt':
+        return _probe_win()
+    if os.name == 'posix':
+        return _probe_posix()
+    raise UserWarning(f'Unsupported os: {os.name}')
+
+
+class DeviceMonitor:
+    """Removable devices snapshot, kept up to date by a background thread.
+
+    On Linux the thread wakes up on kernel uevents (cards inserted or
+    removed) and on mount table changes only, elsewhere and as a fallback
+    devices are probed every interval seconds.
+    on_change(old, new) is called from the thread when devices change.
+    """
+
+    def __init__(self, interval, on_change=None):
+        self.__interval = interval
+        self.__on_change = on_change
+        self.__lock = threading.Lock()
+        self.__devices = {}
+        self.__stop = threading.Event()
+        self.__wakeup = None
+        self.__thread = None
+
+    def start(self):
+        # Devices present on start are the initial state, not a change
+        self.__refresh(notify=False)
+        if hasattr(select, 'poll'):  # not on Windows
+            self.__wakeup = os.pipe()
+        self.__thread = threading.Thread(target=self.__run, name='devices', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        if self.__wakeup is not None:
+            os.write(self.__wakeup[1], b'x')
+        self.__thread.join()
+        self.__thread = None
+        if self.__wakeup is not None:
+            for fd in self.__wakeup:
+                os.close(fd)
+            self.__wakeup = None
+
+    def devices(self):
+        with self.__lock:
+            return dict(self.__devices)
+
+    def refresh(self):
+        """Probe devices now, e.g. right after mount commands."""
+        self.__refresh(notify=True)
+
+    def __refresh(self, notify):
+        try:
+            new = probe()
+        except Exception:
+            logging.exception('devices probe failed')
+            return
+        with self.__lock:
+            old = self.__devices
+            self.__devices = new
+        if new != old:
+            logging.debug('devices changed: %s', new)
+            if notify and self.__on_change is not None:
+                try:
+                    self.__on_change(old, new)
+                except Exception:
+                    logging.exception('devices change handler failed')
+
+    def __run(self):
+        if self.__wakeup is None:
+            while not self.__stop.wait(self.__interval):
+                self.refresh()
+            return
+
+        sources = self.__open_sources()
+        # An idle server does not probe devices, when events are available
+        timeout = None if sources else self.__interval * 1000
+        poller = select.poll()
+        poller.register(self.__wakeup[0], select.POLLIN)
+        for fd, events, _ in sources.values():
+            poller.register(fd, events)
+        try:
+            while not self.__stop.is_set():
+                ready = poller.poll(timeout)
+                changed = not ready
+                for fd, _ in ready:
+                    if fd in sources:
+                        sources[fd][2]()
+                        changed = True
+                if changed and not self.__stop.is_set():
+                    self.refresh()
+        finally:
+            for fd, _, _ in sources.values():
+                os.close(fd)
+
+    def __open_sources(self):
+        """{fd: (fd, poll events, drain function)}, unavailable ones are skipped."""
+        sources = {}
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+            sock.setblocking(False)
+            fd = sock.detach()
+            sources[fd] = (fd, select.POLLIN, lambda: self.__drain_socket(fd))
+        except (OSError, AttributeError) as ex:
+            logging.debug('uevents not available: %s', ex)
+        try:
+            fd = os.open(MOUNTINFO, os.O_RDONLY)
+            # Mount table changes are reported as POLLPRI
+            sources[fd] = (fd, select.POLLPRI | select.POLLERR, lambda: self.__drain_mountinfo(fd))
+            self.__drain_mountinfo(fd)
+        except OSError as ex:
+            logging.debug('mountinfo not available: %s', ex)
+        return sources
+
+    def __drain_socket(self, fd):
+        try:
+            while os.read(fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def __drain_mountinfo(self, fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        while os.read(fd, 65536):
+            pass
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# pylint: disable=redefined-outer-name,unused-argument
+
+import threading
+
+import pytest
+
+from photo_importer import devices
+
+_CARD = {'dev_path': '/dev/sdb1', 'mount_path': '', 'read_only': False}
+
+
+def test_monitor_snapshot_and_changes(monkeypatch):
+    found = {}
+    changes = []
+    monkeypatch.setattr(devices, 'probe', lambda: dict(found))
+    monitor = devices.DeviceMonitor(60, lambda old, new: changes.append((old, new)))
+
+    monitor.refresh()
+    assert not monitor.devices()
+    assert not changes
+
+    found['sdb1'] = _CARD
+    monitor.refresh()
+    monitor.refresh()
+    assert monitor.devices() == {'sdb1': _CARD}
+    assert changes == [({}, {'sdb1': _CARD})]
+
+
+def test_monitor_start_is_not_a_change(monkeypatch):
+    changes = []
+    monkeypatch.setattr(devices, 'probe', lambda: {'sdb1': _CARD})
+    monitor = devices.DeviceMonitor(60, lambda old, new: changes.append((old, new)))
+    monitor.start()
+    try:
+        assert monitor.devices() == {'sdb1': _CARD}
+        assert not changes
+    finally:
+        monitor.stop()
+
+
+@pytest.fixture
+def no_uevents(monkeypatch):
+    # Protocols over MAX_LINKS are not supported
+    monkeypatch.setattr(devices, 'NETLINK_KOBJECT_UEVENT', 99)
+
+
+def test_monitor_polls_without_events(tmp_path, no_uevents, monkeypatch):
+    monkeypatch.setattr(devices, 'MOUNTINFO', str(tmp_path / 'missing'))
+    probed = []
+    enough = threading.Event()
+
+    def probe():
+        probed.append(1)
+        if len(probed) > 3:
+            enough.set()
+        return {}
+
+    monkeypatch.setattr(devices, 'probe', probe)
+    monitor = devices.DeviceMonitor(0.01)
+    monitor.start()
+    try:
+        assert enough.wait(5)
+    finally:
+        monitor.stop()
+    monitor.stop()
+
+
+def test_monitor_keeps_snapshot_on_probe_error(monkeypatch):
+    monkeypatch.setattr(devices, 'probe', lambda: {'sdb1': _CARD})
+    monitor = devices.DeviceMonitor(60)
+    monitor.refresh()
+
+    def broken():
+        raise OSError('no sysfs')
+
+    monkeypatch.setattr(devices, 'probe', broken)
+    monitor.refresh()
+    assert monitor.devices() == {'sdb1': _CARD}
+
+
+def test_monitor_idle_with_events(tmp_path, no_uevents, monkeypatch):
+    # A regular file never reports POLLPRI, like an unchanged mount table
+    mountinfo = tmp_path / 'mountinfo'
+    mountinfo.write_text('')
+    monkeypatch.setattr(devices, 'MOUNTINFO', str(mountinfo))
+    probed = []
+    monkeypatch.setattr(devices, 'probe', lambda: probed.append(1) or {})
+    monitor = devices.DeviceMonitor(0.01)
+    monitor.start()
+    try:
+        threading.Event().wait(0.2)
+    finally:
+        monitor.stop()
+    assert probed == [1]
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+
+import queue
+import threading
+import contextlib
+import exiftool
+
+
+class ExifToolPool:
+    """Pool of persistent exiftool processes, started on demand."""
+
+    def __init__(self, size):
+        self.__size = max(1, size)
+        self.__lock = threading.Lock()
+        self.__helpers = []
+        self.__free = queue.Queue()
+
+    def size(self):
+        return self.__size
+
+    def __acquire(self):
+        try:
+            return self.__free.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.__lock:
+            if len(self.__helpers) < self.__size:
+                et = exiftool.ExifToolHelper()
+                self.__helpers.append(et)
+                return et
+
+        return self.__free.get()
+
+    @contextlib.contextmanager
+    def helper(self):
+        et = self.__acquire()
+        try:
+            yield et
+        finally:
+            with self.__lock:
+                if et in self.__helpers:
+                    self.__free.put(et)
+
+    def close(self):
+        with self.__lock:
+            for et in self.__helpers:
+                et.terminate()
+            self.__helpers = []
+            self.__free = queue.Queue()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
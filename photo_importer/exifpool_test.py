@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+# pylint: disable=redefined-outer-name,unused-argument,too-few-public-methods
+
+import threading
+
+import pytest
+
+from photo_importer import exifpool
+
+
+class _Helper:
+    created = []
+
+    def __init__(self, *args, **kwargs):
+        self.terminated = False
+        _Helper.created.append(self)
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture(autouse=True)
+def fake_helper(monkeypatch):
+    _Helper.created = []
+    monkeypatch.setattr(exifpool.exiftool, 'ExifToolHelper', _Helper)
+
+
+def test_helpers_started_on_demand():
+    pool = exifpool.ExifToolPool(4)
+    assert not _Helper.created
+
+    with pool.helper() as et1:
+        pass
+    with pool.helper() as et2:
+        pass
+
+    assert et1 is et2
+    assert len(_Helper.created) == 1
+
+
+def test_pool_size_is_limited():
+    pool = exifpool.ExifToolPool(2)
+    barrier = threading.Barrier(2)
+    used = set()
+
+    def worker():
+        for _ in range(5):
+            with pool.helper() as et:
+                used.add(id(et))
+                barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(_Helper.created) == 2
+    assert len(used) == 2
+
+
+def test_zero_size_means_one():
+    assert exifpool.ExifToolPool(0).size() == 1
+
+
+def test_close_terminates_all():
+    pool = exifpool.ExifToolPool(2)
+    with pool.helper():
+        with pool.helper():
+            pass
+    pool.close()
+
+    assert len(_Helper.created) == 2
+    assert all(h.terminated for h in _Helper.created)
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+# pylint: disable=too-many-arguments
+
+import mmap
+import struct
+import datetime
+
+# Reads date and orientation tags directly from JPEG/TIFF and MP4/MOV
+# headers. Tag names and value formats follow the exiftool output
+# (with -G -n), so results can be used in place of ExifToolHelper ones.
+
+JPEG_SOI = b'\xff\xd8'
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+JPEG_APP1 = 0xE1
+EXIF_HEADER = b'Exif\x00\x00'
+
+TIFF_ORIENTATION = 0x0112
+TIFF_EXIF_IFD = 0x8769
+TIFF_ASCII = 2
+TIFF_SHORT = 3
+TIFF_LONG = 4
+
+EXIF_TAGS = {
+    0x9003: 'EXIF:DateTimeOriginal',
+    0x9004: 'EXIF:CreateDate',
+}
+
+QT_CONTAINERS = (b'moov', b'trak', b'mdia')
+QT_TOP_LEVEL = (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot')
+QT_EPOCH = datetime.datetime(1904, 1, 1)
+
+
+class FormatError(Exception):
+    pass
+
+
+def read_tags(filename):
+    """Return exiftool-like tags dict, or None if the format is not supported."""
+    with open(filename, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+
+        with data:
+            try:
+                if data[0:2] == JPEG_SOI:
+                    return _read_jpeg(data)
+                if data[0:4] in (b'II*\x00', b'MM\x00*'):
+                    return _read_tiff(data, 0, len(data))
+                if data[4:8] in QT_TOP_LEVEL:
+                    return _read_quicktime(data)
+            except (FormatError, struct.error, IndexError):
+                return None
+    return None
+
+
+def find_orientation(data):
+    """Return (offset, byte order) of the JPEG EXIF:Orientation value or None."""
+    try:
+        app1 = _find_jpeg_exif(data) if data[0:2] == JPEG_SOI else None
+        if app1 is None:
+            return None
+        start, end = app1
+        order = _tiff_order(data, start)
+        for tag, tp, count, value_pos in _ifd_entries(data, start, end, order, _tiff_ifd0(data, start, order)):
+            if tag == TIFF_ORIENTATION and tp == TIFF_SHORT and count == 1:
+                return value_pos, order
+    except (FormatError, struct.error, IndexError):
+        pass
+    return None
+
+
+def _find_jpeg_exif(data):
+    pos = 2
+    size = len(data)
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            raise FormatError('wrong JPEG marker')
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # no length
+            pos += 2
+            continue
+        (length,) = struct.unpack_from('>H', data, pos + 2)
+        if marker == JPEG_APP1 and data[pos + 4 : pos + 10] == EXIF_HEADER:
+            return pos + 10, min(pos + 2 + length, size)
+        pos += 2 + length
+    return None
+
+
+def _read_jpeg(data):
+    app1 = _find_jpeg_exif(data)
+    if app1 is None:
+        return {}
+    return _read_tiff(data, *app1)
+
+
+def _tiff_order(data, start):
+    order = data[start : start + 2]
+    if order == b'II':
+        return '<'
+    if order == b'MM':
+        return '>'
+    raise FormatError('wrong TIFF byte order')
+
+
+def _tiff_ifd0(data, start, order):
+    (ifd,) = struct.unpack_from(order + 'I', data, start + 4)
+    return ifd
+
+
+def _ifd_entries(data, start, end, order, ifd):
+    pos = start + ifd
+    if ifd == 0 or pos + 2 > end:
+        return
+    (count,) = struct.unpack_from(order + 'H', data, pos)
+    pos += 2
+    for _ in range(count):
+        if pos + 12 > end:
+            raise FormatError('IFD out of range')
+        tag, tp, cnt = struct.unpack_from(order + 'HHI', data, pos)
+        yield tag, tp, cnt, pos + 8
+        pos += 12
+
+
+def _read_ascii(data, start, end, order, count, value_pos):
+    if count > 4:
+        (offset,) = struct.unpack_from(order + 'I', data, value_pos)
+        value_pos = start + offset
+    if value_pos + count > end:
+        raise FormatError('value out of range')
+    return bytes(data[value_pos : value_pos + count]).rstrip(b'\x00 ').decode('ascii', 'replace')
+
+
+def _read_tiff(data, start, end):
+    order = _tiff_order(data, start)
+    res = {}
+    exif_ifd = 0
+    for tag, tp, count, value_pos in _ifd_entries(data, start, end, order, _tiff_ifd0(data, start, order)):
+        if tag == TIFF_ORIENTATION and tp == TIFF_SHORT:
+            (res['EXIF:Orientation'],) = struct.unpack_from(order + 'H', data, value_pos)
+        elif tag == TIFF_EXIF_IFD and tp == TIFF_LONG:
+            (exif_ifd,) = struct.unpack_from(order + 'I', data, value_pos)
+
+    for tag, tp, count, value_pos in _ifd_entries(data, start, end, order, exif_ifd):
+        if tag in EXIF_TAGS and tp == TIFF_ASCII:
+            res[EXIF_TAGS[tag]] = _read_ascii(data, start, end, order, count, value_pos)
+
+    return res
+
+
+def _qt_boxes(data, pos, end):
+    while pos + 8 <= end:
+        size, box = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from('>Q', data, pos + 8)
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise FormatError('wrong box size')
+        yield box, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _qt_time(data, pos):
+    version = data[pos]
+    if version == 1:
+        (seconds,) = struct.unpack_from('>Q', data, pos + 4)
+    else:
+        (seconds,) = struct.unpack_from('>I', data, pos + 4)
+    if seconds == 0:
+        return None
+    return (QT_EPOCH + datetime.timedelta(seconds=seconds)).strftime('%Y:%m:%d %H:%M:%S')
+
+
+def _read_quicktime(data, pos=0, end=None, res=None):
+    if end is None:
+        end = len(data)
+    if res is None:
+        res = {}
+    for box, start, stop in _qt_boxes(data, pos, end):
+        if box in QT_CONTAINERS:
+            _read_quicktime(data, start, stop, res)
+        elif box == b'mvhd' and 'QuickTime:CreateDate' not in res:
+            ftime = _qt_time(data, start)
+            if ftime:
+                res['QuickTime:CreateDate'] = ftime
+        elif box == b'mdhd' and 'QuickTime:MediaCreateDate' not in res:
+            ftime = _qt_time(data, start)
+            if ftime:
+                res['QuickTime:MediaCreateDate'] = ftime
+    return res
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+import os
+import struct
+
+from photo_importer import exifreader
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+def _tiff(order, orientation, date):
+    date = date.encode('ascii') + b'\x00'
+    # header, IFD0 (orientation + exif pointer), exif IFD, date value
+    ifd0 = 8
+    exif_ifd = ifd0 + 2 + 2 * 12 + 4
+    value = exif_ifd + 2 + 12 + 4
+    res = (b'II' if order == '<' else b'MM') + struct.pack(order + 'HI', 42, ifd0)
+    res += struct.pack(order + 'H', 2)
+    res += struct.pack(order + 'HHIHH', 0x0112, 3, 1, orientation, 0)
+    res += struct.pack(order + 'HHII', 0x8769, 4, 1, exif_ifd)
+    res += struct.pack(order + 'I', 0)
+    res += struct.pack(order + 'H', 1)
+    res += struct.pack(order + 'HHII', 0x9003, 2, len(date), value)
+    res += struct.pack(order + 'I', 0)
+    return res + date
+
+
+def _jpeg(tiff):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    app1 = b'\xff\xe1' + struct.pack('>H', len(tiff) + 8) + b'Exif\x00\x00' + tiff
+    return b'\xff\xd8' + app0 + app1 + b'\xff\xda\x00\x02' + b'\x00' * 16 + b'\xff\xd9'
+
+
+def _box(name, payload):
+    return struct.pack('>I', len(payload) + 8) + name + payload
+
+
+def _write(tmp_path, name, data):
+    p = tmp_path / name
+    p.write_bytes(data)
+    return str(p)
+
+
+def test_test_data_jpegs():
+    tags = exifreader.read_tags(os.path.join(TEST_DATA, 'img_1.JPG'))
+    assert tags['EXIF:DateTimeOriginal'] == '2022:11:21 00:42:07'
+    assert tags['EXIF:Orientation'] == 1
+
+    tags = exifreader.read_tags(os.path.join(TEST_DATA, 'img_2.jpeg'))
+    assert tags['EXIF:DateTimeOriginal'] == '2021:12:19 13:11:36'
+
+
+def test_jpeg_big_endian(tmp_path):
+    fname = _write(tmp_path, 'a.jpg', _jpeg(_tiff('>', 6, '2020:05:01 12:00:00')))
+    assert exifreader.read_tags(fname) == {
+        'EXIF:Orientation': 6,
+        'EXIF:DateTimeOriginal': '2020:05:01 12:00:00',
+    }
+
+
+def test_tiff_raw(tmp_path):
+    fname = _write(tmp_path, 'a.cr2', _tiff('<', 8, '2020:05:01 12:00:00'))
+    assert exifreader.read_tags(fname)['EXIF:Orientation'] == 8
+
+
+def test_jpeg_without_exif(tmp_path):
+    fname = _write(tmp_path, 'a.jpg', b'\xff\xd8\xff\xda\x00\x02\xff\xd9')
+    assert exifreader.read_tags(fname) == {}
+
+
+def test_quicktime(tmp_path):
+    mvhd = _box(b'mvhd', struct.pack('>II', 0, 3690000000) + b'\x00' * 92)
+    mdhd = _box(b'mdhd', struct.pack('>IQQ', 0x01000000, 3690000060, 0) + b'\x00' * 16)
+    moov = _box(b'moov', mvhd + _box(b'trak', _box(b'mdia', mdhd)))
+    fname = _write(tmp_path, 'a.mp4', _box(b'ftyp', b'isom\x00\x00\x00\x00') + _box(b'mdat', b'x' * 32) + moov)
+
+    assert exifreader.read_tags(fname) == {
+        'QuickTime:CreateDate': '2020:12:05 08:00:00',
+        'QuickTime:MediaCreateDate': '2020:12:05 08:01:00',
+    }
+
+
+def test_quicktime_zero_date(tmp_path):
+    moov = _box(b'moov', _box(b'mvhd', b'\x00' * 100))
+    fname = _write(tmp_path, 'a.mov', _box(b'ftyp', b'qt  ') + moov)
+    assert exifreader.read_tags(fname) == {}
+
+
+def test_unsupported(tmp_path):
+    assert exifreader.read_tags(_write(tmp_path, 'a.mp3', b'ID3' + b'\x00' * 32)) is None
+    assert exifreader.read_tags(_write(tmp_path, 'empty.jpg', b'')) is None
+
+
+def test_truncated(tmp_path):
+    data = _jpeg(_tiff('<', 6, '2020:05:01 12:00:00'))
+    assert exifreader.read_tags(_write(tmp_path, 'a.jpg', data[:40])) is None
+
+
+def test_find_orientation():
+    data = _jpeg(_tiff('>', 6, '2020:05:01 12:00:00'))
+    pos, order = exifreader.find_orientation(data)
+    assert order == '>'
+    assert struct.unpack_from('>H', data, pos) == (6,)
+
+    assert exifreader.find_orientation(b'\xff\xd8\xff\xda\x00\x02\xff\xd9') is None
+    assert exifreader.find_orientation(b'not a jpeg') is None
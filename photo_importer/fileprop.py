@@ -1,14 +1,26 @@
 #!/usr/bin/python3
-# pylint: disable=too-many-arguments
+# pylint: disable=too-many-arguments,too-many-instance-attributes
 
 import os
 import re
+import json
 import stat
+import sys
 import time
 import logging
 import datetime
+import itertools
+import threading
+import collections
+import concurrent.futures
 import exiftool
 
+from photo_importer import log
+from photo_importer import exifpool
+from photo_importer import exifreader
+from photo_importer import scanner
+from photo_importer import metacache
+
 
 IGNORE = 0
 IMAGE = 1
@@ -16,6 +28,8 @@ VIDEO = 2
 AUDIO = 3
 GARBAGE = 4
 
+ORIENTATION_TAG = 'EXIF:Orientation'
+
 
 class FileProp:
     DATE_REGEX = [
@@ -69,16 +83,44 @@ class FileProp:
         'EXIF:CreateDate',
     ]
 
-    def __init__(self, conf):
+    def __init__(self, conf, exif_pool=None, input_path=None):
         self.__config = conf
+        # (input path prefix, its realpath prefix), resolved once for the cache keys
+        self.__root = None
+        if input_path:
+            self.__root = (os.path.join(input_path, ''), os.path.join(os.path.realpath(input_path), ''))
         self.__prepare_ext_to_type()
-        self.__out_list = set()
-        self.__exiftool = exiftool.ExifToolHelper()
+        # Names in the output dirs (from disk and reserved), by dir
+        self.__dir_index = {}
+        # Next suffix to try, by (dir, out_name, ext)
+        self.__next_suffix = {}
+        self.__out_lock = threading.Lock()
+        self.__exif_prefetched = {}
+        self.__name_fast_path = int(self.__config['main']['name_fast_path'])
+        self.__use_native_exif = int(self.__config['main']['use_native_exif'])
+        # A given pool is shared with other users and is not closed here
+        self.__own_exiftool = exif_pool is None
+        if exif_pool is None:
+            workers = int(self.__config['main']['exif_workers'])
+            if workers == 0:
+                workers = int(self.__config['main']['threads_count'])
+            exif_pool = exifpool.ExifToolPool(workers)
+        self.__exiftool = exif_pool
+        self.__cache = None
+        if int(self.__config['main']['use_cache']):
+            self.__cache = metacache.MetaCache(
+                os.path.expanduser(self.__config['main']['cache_file']),
+                int(self.__config['main']['cache_size']),
+            )
 
     def close(self):
         if self.__exiftool is not None:
-            self.__exiftool.terminate()
+            if self.__own_exiftool:
+                self.__exiftool.close()
             self.__exiftool = None
+        if self.__cache is not None:
+            self.__cache.close()
+            self.__cache = None
 
     def __del__(self):
         self.close()
@@ -105,18 +147,22 @@ class FileProp:
             logging.warning('Unknown ext: %s', ext)
             return IGNORE
 
-    def __time(self, fullname, name, tp):
+    def __time(self, fullname, name, tp, record):
         if tp not in (IMAGE, VIDEO, AUDIO):
             return None
 
+        ftime = self.__time_by_fast_path(name, tp)
+        if ftime:
+            return ftime
+
         for src in self.__config['main'][self.TIME_SRC_CFG[tp]].split(','):
             ftime = None
             if src == 'exif':
-                ftime = self.__time_by_exif(fullname)
+                ftime = self.__time_by_exif(fullname, tp, record)
             elif src == 'name':
                 ftime = self.__time_by_name(name)
             elif src == 'attr':
-                ftime = self.__time_by_attr(fullname)
+                ftime = self.__time_by_attr(fullname, record)
             else:
                 raise UserWarning(f'Wrong time_src: {src}')
 
@@ -125,8 +171,18 @@ class FileProp:
 
         return None
 
-    def __time_by_name(self, fname):
+    def __time_by_fast_path(self, name, tp):
+        # Full timestamp in the file name is trusted, exif is not read
+        if not self.__name_fast_path:
+            return None
+        if 'name' not in self.__config['main'][self.TIME_SRC_CFG[tp]].split(','):
+            return None
+        return self.__time_by_name(name, full_only=True)
+
+    def __time_by_name(self, fname, full_only=False):
         for exp, fs in self.DATE_REGEX:
+            if full_only and '%S' not in fs:
+                continue
             mat = exp.findall(fname)
             if len(mat):
                 try:
@@ -139,9 +195,93 @@ class FileProp:
                     pass
         return None
 
-    def __time_by_exif(self, fullname):
+    def __need_exif(self, name, tp):
+        if tp not in self.TIME_SRC_CFG:
+            return False
+        if 'exif' not in self.__config['main'][self.TIME_SRC_CFG[tp]].split(','):
+            return False
+        return self.__time_by_fast_path(name, tp) is None
+
+    def __cached_exif(self, fullname, tp, record):
+        if self.__cache is None:
+            return None, None
+        key = self.__cache.key(fullname, record, self.__real_name(fullname, record))
+        cached = self.__cache.get(key) if key is not None else None
+        if cached is not None and cached[0] != tp:
+            cached = None
+        return key, cached
+
+    def __real_name(self, fullname, record):
+        # Scanned dirs are not symlinks, so only the root has to be resolved
+        if record is None or self.__root is None or not fullname.startswith(self.__root[0]):
+            return None
+        return self.__root[1] + fullname[len(self.__root[0]) :]
+
+    def __exif_result(self, fullname, key, tp, metadata):
+        # Missing orientation tag means normal orientation
+        res = (self.__time_by_metadata(fullname, metadata), metadata.get(ORIENTATION_TAG, 1))
+        if key is not None:
+            self.__cache.put(key, tp, *res)
+        return res
+
+    def __exif_without_exiftool(self, filenames):
+        # Results of the cache and the native reader, the rest is left for exiftool
+        res = {}
+        need_exif = {}
+        for item in filenames:
+            fullname = scanner.path_of(item)
+            name, ext = os.path.splitext(os.path.basename(fullname))
+            tp = self.ext_to_type.get(ext.lower(), IGNORE)
+            if not self.__need_exif(name, tp):
+                continue
+            key, cached = self.__cached_exif(fullname, tp, scanner.record_of(item))
+            if cached is not None:
+                res[os.path.normpath(fullname)] = cached[1:]
+                continue
+
+            metadata = self.__native_metadata(fullname)
+            if metadata is not None:
+                res[os.path.normpath(fullname)] = self.__exif_result(fullname, key, tp, metadata)
+            else:
+                need_exif[os.path.normpath(fullname)] = (fullname, key, tp)
+        return res, need_exif
+
+    def __fetch_exif(self, filenames):
+        res, need_exif = self.__exif_without_exiftool(filenames)
+        if not need_exif:
+            return filenames, res
+
+        try:
+            with self.__exiftool.helper() as et:
+                metadata_list = et.get_tags([v[0] for v in need_exif.values()], self.DATE_TAGS + [ORIENTATION_TAG])
+        except exiftool.exceptions.ExifToolExecuteError as ex:
+            # Some files of the batch failed, but the rest is still valid
+            metadata_list = json.loads(ex.stdout) if ex.stdout else []
+        except Exception as ex:
+            logging.warning('batch exif exception: %s', ex)
+            return filenames, res
+
+        for metadata in metadata_list:
+            path = os.path.normpath(metadata.get('SourceFile', ''))
+            if path in need_exif:
+                res[path] = self.__exif_result(*need_exif[path], metadata)
+        return filenames, res
+
+    def __native_metadata(self, fullname):
+        # Unsupported formats and files without date tags go to exiftool
+        if not self.__use_native_exif:
+            return None
+        try:
+            metadata = exifreader.read_tags(fullname)
+        except OSError as ex:
+            logging.debug('native exif (%s) exception: %s', fullname, ex)
+            return None
+        if metadata is None or not any(tag in metadata for tag in self.DATE_TAGS):
+            return None
+        return metadata
+
+    def __time_by_metadata(self, fullname, metadata):
         try:
-            metadata = self.__exiftool.get_metadata(fullname)[0]
             for tag in self.DATE_TAGS:
                 if tag in metadata:
                     md = metadata[tag]
@@ -149,17 +289,42 @@ class FileProp:
                     if pos > 0:
                         md = md[0:pos]
                     return datetime.datetime.strptime(md, '%Y:%m:%d %H:%M:%S')
-
-            logging.warning('time by exif (%s) not found tags count: %s', fullname, len(metadata))
-            for tag, val in metadata.items():
-                logging.debug('%s: %s', tag, val)
         except Exception as ex:
             logging.warning('time by exif (%s) exception: %s', fullname, ex)
+            return None
+
+        logging.warning('time by exif (%s) not found tags count: %s', fullname, len(metadata))
+        for tag, val in metadata.items():
+            logging.debug('%s: %s', tag, val)
         return None
 
-    def __time_by_attr(self, fullname):
+    def __time_by_exif(self, fullname, tp, record):
+        path = os.path.normpath(fullname)
+        if path in self.__exif_prefetched:
+            return self.__exif_prefetched[path][0]
+
+        key, cached = self.__cached_exif(fullname, tp, record)
+        if cached is not None:
+            return cached[1]
+
+        metadata = self.__native_metadata(fullname)
+        if metadata is None:
+            try:
+                with self.__exiftool.helper() as et:
+                    metadata = et.get_metadata(fullname)[0]
+            except Exception as ex:
+                logging.warning('time by exif (%s) exception: %s', fullname, ex)
+                return None
+
+        return self.__exif_result(fullname, key, tp, metadata)[0]
+
+    def __time_by_attr(self, fullname, record):
         try:
-            return datetime.datetime.fromtimestamp(time.mktime(time.localtime(os.stat(fullname)[stat.ST_MTIME])))
+            if record is not None:
+                mtime = record.mtime_ns // 1000000000
+            else:
+                mtime = os.stat(fullname)[stat.ST_MTIME]
+            return datetime.datetime.fromtimestamp(time.mktime(time.localtime(mtime)))
         except (FileNotFoundError, KeyError) as ex:
             logging.warning('time by attr (%s) exception: %s', fullname, ex)
         return None
@@ -173,26 +338,50 @@ class FileProp:
                 return ''
         return '_' + self.SPACE_REGEX.sub('_', fname)
 
-    def out_name_full(self, path, out_name, ext):
-        res = os.path.join(path, out_name) + ext
-
-        i = 1
-        while os.path.isfile(res) or res in self.__out_list:
-            i += 1
-            res = os.path.join(path, out_name + '_' + str(i) + ext)
+    def __dir_names(self, path):
+        path = os.path.normpath(path)
+        names = self.__dir_index.get(path)
+        if names is None:
+            try:
+                with os.scandir(path) as it:
+                    names = {os.path.normcase(entry.name) for entry in it}
+            except OSError:  # not created yet (or dry run)
+                names = set()
+            self.__dir_index[path] = names
+        return names
 
-        self.__out_list.add(res)
-
-        return res
+    def out_name_full(self, path, out_name, ext):
+        # Reserved names are not on disk yet while files are being copied
+        with self.__out_lock:
+            names = self.__dir_names(path)
+            key = (os.path.normpath(path), out_name, ext)
+            i = self.__next_suffix.get(key, 1)
+            while True:
+                name = out_name + ext if i == 1 else out_name + '_' + str(i) + ext
+                if os.path.normcase(name) not in names:
+                    # Other imports and processes may write to the same dir
+                    if not os.path.lexists(os.path.join(path, name)):
+                        break
+                    names.add(os.path.normcase(name))
+                i += 1
+
+            names.add(os.path.normcase(name))
+            self.__next_suffix[key] = i + 1
+
+        return os.path.join(path, name)
 
     def get(self, fullname):
+        # Stat info of scanner records is used in place of stat calls
+        record = scanner.record_of(fullname)
+        fullname = scanner.path_of(fullname)
+
         path, fname_ext = os.path.split(fullname)
         fname, ext = os.path.splitext(fname_ext)
         ext = ext.lower()
 
         tp = self.__type_by_ext(ext)
 
-        ftime = self.__time(fullname, fname, tp)
+        ftime = self.__time(fullname, fname, tp, record)
         time_shift = self.__config['main']['time_shift']
         if ftime and time_shift:
             ftime += datetime.timedelta(seconds=int(time_shift))
@@ -207,18 +396,58 @@ class FileProp:
         else:
             ok = False
 
-        return FilePropRes(self, tp, ftime, path, ext, out_name, ok)
+        orientation = None
+        if tp == IMAGE:
+            orientation = self.__exif_prefetched.get(os.path.normpath(fullname), (None, None))[1]
+
+        return FilePropRes(self, tp, ftime, path, ext, out_name, ok, orientation)
+
+    def __get_prefetched(self, filenames, prefetched):
+        self.__exif_prefetched = prefetched
+        try:
+            for item in filenames:
+                fullname = scanner.path_of(item)
+                try:
+                    prop = self.get(item)
+                except Exception as ex:
+                    logging.error('File prop (%s) exception: %s', fullname, ex)
+                    prop = None
+                yield fullname, prop
+        finally:
+            self.__exif_prefetched = {}
+
+    def get_many(self, filenames, batch_size=100):
+        # Batches are fetched in parallel by the exiftool pool, but results
+        # are yielded in the input order, so output naming stays deterministic
+        workers = self.__exiftool.size()
+        it = iter(filenames)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, **log.executor_args()) as executor:
+            futures = collections.deque()
+            while True:
+                batch = list(itertools.islice(it, batch_size))
+                if batch:
+                    futures.append(executor.submit(self.__fetch_exif, batch))
+                    if len(futures) <= workers:
+                        continue
+                if not futures:
+                    break
+                yield from self.__get_prefetched(*futures.popleft().result())
 
 
 class FilePropRes:
-    def __init__(self, prop_ptr, tp, ftime, path, ext, out_name, ok):
+    # One instance per imported file, so no instance dict; dirs and
+    # extensions are shared by many files and interned
+    __slots__ = ('__prop_ptr', '__type', '__time', '__path', '__ext', '__out_name', '__ok', '__orientation')
+
+    def __init__(self, prop_ptr, tp, ftime, path, ext, out_name, ok, orientation=None):
         self.__prop_ptr = prop_ptr
         self.__type = tp
         self.__time = ftime
-        self.__path = path
-        self.__ext = ext
+        self.__path = sys.intern(path)
+        self.__ext = sys.intern(ext)
         self.__out_name = out_name
         self.__ok = ok
+        self.__orientation = orientation
 
     def type(self):
         return self.__type
@@ -238,6 +467,10 @@ class FilePropRes:
     def out_name(self):
         return self.__out_name
 
+    def orientation(self):
+        """EXIF orientation read with the time, or None if it is unknown"""
+        return self.__orientation
+
     def out_name_full(self, path=None):
         if path is None:
             path = self.__path
@@ -246,11 +479,8 @@ class FilePropRes:
 
 
 if __name__ == '__main__':
-    import sys
-
     sys.path.insert(0, os.path.abspath('..'))
 
-    from photo_importer import log
     from photo_importer import config
 
     log.init_logger(None, logging.DEBUG)
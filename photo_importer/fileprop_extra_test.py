@@ -2,10 +2,14 @@
 # pylint: disable=redefined-outer-name,unused-argument,too-few-public-methods
 
 import os
+import json
+import pathlib
 import datetime
+import tracemalloc
 
 import pytest
 
+from photo_importer import scanner
 from photo_importer import fileprop
 
 
@@ -94,7 +98,282 @@ def test_out_name_full_deduplicates(tmp_path, exif_cfg):
     assert n2.endswith('2020-01-01_00-00-00_2.jpg')
 
 
+def test_out_name_full_lists_dir_once(tmp_path, exif_cfg, monkeypatch):
+    exif_cfg.set('main', 'time_src_image', 'name')
+    (tmp_path / '2020-01-01_00-00-00.jpg').write_bytes(b'x')
+    (tmp_path / '2020-01-01_00-00-00_2.jpg').write_bytes(b'x')
+    fp = fileprop.FileProp(exif_cfg)
+    res = fp.get('2020-01-01_00-00-00.jpg')
+    scandir = os.scandir
+    scanned = []
+    monkeypatch.setattr(fileprop.os, 'scandir', lambda p: scanned.append(p) or scandir(p))
+    monkeypatch.setattr(fileprop.os.path, 'isfile', None)
+
+    names = [os.path.basename(res.out_name_full(str(tmp_path))) for _ in range(3)]
+
+    assert names == ['2020-01-01_00-00-00_3.jpg', '2020-01-01_00-00-00_4.jpg', '2020-01-01_00-00-00_5.jpg']
+    assert scanned == [str(tmp_path)]
+
+
+def test_out_name_full_sees_other_writers(tmp_path, exif_cfg):
+    exif_cfg.set('main', 'time_src_image', 'name')
+    first = fileprop.FileProp(exif_cfg).get('2020-01-01_00-00-00.jpg')
+    second = fileprop.FileProp(exif_cfg).get('2020-01-01_00-00-00.jpg')
+    first.out_name_full(str(tmp_path))
+    second.out_name_full(str(tmp_path))  # the dir is listed before the write
+
+    name = first.out_name_full(str(tmp_path))
+    pathlib.Path(name).write_bytes(b'x')
+
+    assert second.out_name_full(str(tmp_path)) != name
+
+
+def test_out_name_full_missing_dir(tmp_path, exif_cfg):
+    exif_cfg.set('main', 'time_src_image', 'name')
+    res = fileprop.FileProp(exif_cfg).get('2020-01-01_00-00-00.jpg')
+
+    assert res.out_name_full(str(tmp_path / 'new')) == str(tmp_path / 'new' / '2020-01-01_00-00-00.jpg')
+
+
 def test_close_is_idempotent(exif_cfg):
     fp = fileprop.FileProp(exif_cfg)
     fp.close()
     fp.close()  # must not raise
+
+
+class _BatchHelper:
+    """ExifToolHelper stand-in answering batched get_tags requests."""
+
+    calls = []
+    fail = False
+    orientation = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_tags(self, files, tags):
+        _BatchHelper.calls.append(list(files))
+        res = [{'SourceFile': f, 'EXIF:DateTimeOriginal': '2020:05:01 12:00:00'} for f in files]
+        if _BatchHelper.orientation is not None:
+            for r in res:
+                r[fileprop.ORIENTATION_TAG] = _BatchHelper.orientation
+        if _BatchHelper.fail:
+            raise fileprop.exiftool.exceptions.ExifToolExecuteError(1, json.dumps(res), 'error', [])
+        return res
+
+    def get_metadata(self, fullname):
+        raise AssertionError('per-file lookup is not expected')
+
+    def terminate(self):
+        pass
+
+
+@pytest.fixture
+def batch_cfg(cfg, monkeypatch):
+    monkeypatch.setattr(fileprop.exiftool, 'ExifToolHelper', _BatchHelper)
+    _BatchHelper.calls = []
+    _BatchHelper.fail = False
+    _BatchHelper.orientation = None
+    return cfg
+
+
+def test_get_many_batches_exif_requests(batch_cfg):
+    names = [f'/x/photo{i}.jpg' for i in range(5)] + ['/x/M0101.CTG']
+    res = list(fileprop.FileProp(batch_cfg).get_many(names, batch_size=2))
+
+    assert [fn for fn, _ in res] == names
+    assert _BatchHelper.calls == [names[0:2], names[2:4], names[4:5]]
+    assert res[0][1].time() == datetime.datetime(2020, 5, 1, 12, 0, 0)
+    assert res[5][1].type() == fileprop.GARBAGE
+
+
+def test_get_many_uses_partial_batch_output(batch_cfg):
+    _BatchHelper.fail = True
+    res = list(fileprop.FileProp(batch_cfg).get_many(['/x/a.jpg', '/x/b.jpg']))
+
+    assert len(_BatchHelper.calls) == 1
+    assert all(prop.time() == datetime.datetime(2020, 5, 1, 12, 0, 0) for _, prop in res)
+
+
+def test_get_many_reports_failed_file(batch_cfg):
+    batch_cfg.set('main', 'time_src_image', 'bogus')
+    res = list(fileprop.FileProp(batch_cfg).get_many(['/x/a.jpg', '/x/M0101.CTG']))
+
+    assert res[0] == ('/x/a.jpg', None)
+    assert res[1][1].type() == fileprop.GARBAGE
+
+
+def test_get_many_parallel_keeps_order(batch_cfg):
+    batch_cfg.set('main', 'exif_workers', '3')
+    names = [f'/x/photo{i}.jpg' for i in range(20)]
+    res = list(fileprop.FileProp(batch_cfg).get_many(names, batch_size=3))
+
+    assert [fn for fn, _ in res] == names
+    assert sorted(map(tuple, _BatchHelper.calls)) == sorted(tuple(names[i : i + 3]) for i in range(0, 20, 3))
+
+
+def test_exif_workers_zero_uses_threads_count(batch_cfg, monkeypatch):
+    batch_cfg.set('main', 'exif_workers', '0')
+    batch_cfg.set('main', 'threads_count', '5')
+    sizes = []
+    pool = fileprop.exifpool.ExifToolPool
+    monkeypatch.setattr(fileprop.exifpool, 'ExifToolPool', lambda size: sizes.append(size) or pool(size))
+    fileprop.FileProp(batch_cfg).close()
+    assert sizes == [5]
+
+
+def test_second_pass_uses_cache(tmp_path, batch_cfg):
+    batch_cfg.set('main', 'use_cache', '1')
+    names = []
+    for i in range(3):
+        f = tmp_path / f'photo{i}.jpg'
+        f.write_bytes(b'x')
+        names.append(str(f))
+
+    with fileprop.FileProp(batch_cfg) as fp:
+        first = [prop.time() for _, prop in fp.get_many(names)]
+    assert len(_BatchHelper.calls) == 1
+
+    with fileprop.FileProp(batch_cfg) as fp:
+        second = [prop.time() for _, prop in fp.get_many(names)]
+        assert fp.get(names[0]).time() == first[0]
+    assert len(_BatchHelper.calls) == 1
+    assert second == first
+
+
+def test_cache_disabled(tmp_path, batch_cfg):
+    batch_cfg.set('main', 'use_cache', '0')
+    f = tmp_path / 'photo.jpg'
+    f.write_bytes(b'x')
+
+    for _ in range(2):
+        with fileprop.FileProp(batch_cfg) as fp:
+            list(fp.get_many([str(f)]))
+    assert len(_BatchHelper.calls) == 2
+
+
+def test_name_fast_path_skips_exif(batch_cfg):
+    batch_cfg.set('main', 'name_fast_path', '1')
+    names = ['/x/20230101_120000.jpg', '/x/IMG-20171205-WA0006.jpg', '/x/DSC_0001.jpg']
+    res = list(fileprop.FileProp(batch_cfg).get_many(names))
+
+    assert _BatchHelper.calls == [names[1:]]
+    assert res[0][1].time() == datetime.datetime(2023, 1, 1, 12, 0, 0)
+    assert res[1][1].time() == datetime.datetime(2020, 5, 1, 12, 0, 0)
+
+
+def test_name_fast_path_needs_name_source(batch_cfg):
+    batch_cfg.set('main', 'name_fast_path', '1')
+    batch_cfg.set('main', 'time_src_image', 'exif')
+    res = list(fileprop.FileProp(batch_cfg).get_many(['/x/20230101_120000.jpg']))
+
+    assert len(_BatchHelper.calls) == 1
+    assert res[0][1].time() == datetime.datetime(2020, 5, 1, 12, 0, 0)
+
+
+def test_native_exif_skips_exiftool(batch_cfg):
+    batch_cfg.set('main', 'use_native_exif', '1')
+    batch_cfg.set('main', 'use_cache', '0')
+    test_data = os.path.join(os.path.dirname(__file__), 'test_data')
+    names = [os.path.join(test_data, 'img_1.JPG'), os.path.join(test_data, 'img_2.jpeg')]
+
+    fp = fileprop.FileProp(batch_cfg)
+    res = list(fp.get_many(names))
+
+    assert not _BatchHelper.calls
+    assert res[0][1].time() == datetime.datetime(2022, 11, 21, 0, 42, 7)
+    assert res[1][1].time() == datetime.datetime(2021, 12, 19, 13, 11, 36)
+
+
+def test_native_exif_falls_back_to_exiftool(tmp_path, batch_cfg):
+    batch_cfg.set('main', 'use_native_exif', '1')
+    f = tmp_path / 'photo.jpg'
+    f.write_bytes(b'\xff\xd8\xff\xda\x00\x02\xff\xd9')  # no exif data
+
+    res = list(fileprop.FileProp(batch_cfg).get_many([str(f)]))
+
+    assert _BatchHelper.calls == [[str(f)]]
+    assert res[0][1].time() == datetime.datetime(2020, 5, 1, 12, 0, 0)
+
+
+def test_orientation_kept_with_prop(tmp_path, batch_cfg):
+    batch_cfg.set('main', 'use_cache', '1')
+    _BatchHelper.orientation = 6
+    names = [str(tmp_path / 'photo.jpg'), str(tmp_path / 'clip.mp4')]
+    for name in names:
+        pathlib.Path(name).write_bytes(b'x')
+
+    for _ in range(2):  # the second pass reads the cache
+        with fileprop.FileProp(batch_cfg) as fp:
+            res = list(fp.get_many(names))
+        assert res[0][1].orientation() == 6
+        assert res[1][1].orientation() is None
+    assert _BatchHelper.calls == [names]
+
+
+def test_cache_key_resolves_input_path_once(tmp_path, batch_cfg, monkeypatch):
+    batch_cfg.set('main', 'use_cache', '1')
+    real = tmp_path / 'real'
+    (real / 'sub').mkdir(parents=True)
+    for i in range(3):
+        (real / 'sub' / f'photo{i}.jpg').write_bytes(b'x')
+    link = tmp_path / 'link'
+    link.symlink_to(real)
+    records = list(scanner.scan(str(link)))
+
+    resolved = []
+    realpath = os.path.realpath
+    with monkeypatch.context() as m:
+        m.setattr(os.path, 'realpath', lambda p: resolved.append(p) or realpath(p))
+        with fileprop.FileProp(batch_cfg, input_path=str(link)) as fp:
+            list(fp.get_many(records))
+    assert resolved == [str(link)]
+
+    # Keys are the resolved paths, so the real dir hits the cache
+    with fileprop.FileProp(batch_cfg) as fp:
+        list(fp.get_many(list(scanner.scan(str(real)))))
+    assert len(_BatchHelper.calls) == 1
+
+
+def test_missing_orientation_is_normal(batch_cfg):
+    res = list(fileprop.FileProp(batch_cfg).get_many(['/x/photo.jpg']))
+    assert res[0][1].orientation() == 1
+
+
+def test_orientation_unknown_without_exif(batch_cfg):
+    batch_cfg.set('main', 'time_src_image', 'name')
+    res = list(fileprop.FileProp(batch_cfg).get_many(['/x/2020-01-01_00-00-00.jpg']))
+    assert res[0][1].orientation() is None
+
+
+def test_scanner_record_avoids_stat(tmp_path, batch_cfg, monkeypatch):
+    batch_cfg.set('main', 'time_src_image', 'attr')
+    f = tmp_path / 'photo.jpg'
+    f.write_bytes(b'x')
+    os.utime(f, (1590969600, 1590969600))
+    record = next(scanner.scan(str(tmp_path)))
+    monkeypatch.setattr(fileprop.os, 'stat', None)
+
+    res = list(fileprop.FileProp(batch_cfg).get_many([record]))
+
+    assert res[0][0] == str(f)
+    assert res[0][1].time() == datetime.datetime.fromtimestamp(1590969600)
+
+
+def test_prop_result_is_compact(exif_cfg):
+    exif_cfg.set('main', 'time_src_image', 'name')
+    exif_cfg.set('main', 'use_cache', '0')
+    fp = fileprop.FileProp(exif_cfg)
+    names = [f'/input/DCIM/100CANON/2020-01-01_00-00-{i % 60:02d}_{i}.jpg' for i in range(2000)]
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        res = [fp.get(name) for name in names]
+        size = (tracemalloc.get_traced_memory()[0] - before) / len(res)
+    finally:
+        tracemalloc.stop()
+
+    assert not hasattr(res[0], '__dict__')
+    assert res[0].path() is res[1].path()
+    assert size < 350  # instance, time and out name
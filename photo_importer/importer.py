@@ -1,54 +1,225 @@
 #!/usr/bin/python3
-# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-instance-attributes,too-many-arguments
 
 import os
+import queue
 import logging
 import threading
 
 from photo_importer import log
 from photo_importer import mover
 from photo_importer import rotator
+from photo_importer import scanner
+from photo_importer import journal
 from photo_importer import fileprop
 
 
 class Importer(threading.Thread):
-    def __init__(self, config, input_path, output_path, dryrun):
+    PIPELINE_QUEUE_SIZE = 1000
+
+    def __init__(self, config, input_path, output_path, dryrun, pools=None, on_done=None):
         threading.Thread.__init__(self)
         self.__config = config
         self.__input_path = input_path
         self.__output_path = output_path
         self.__dryrun = dryrun
+        # Exiftool processes and rotate workers shared with other imports
+        self.__pools = pools
+        self.__on_done = on_done
+        self.__cancel = threading.Event()
+        self.__journal = None
         self.__mov = None
         self.__rot = None
         self.__stat = {'stage': ''}
-        self.__log = log.MemLogger(input_path)
+        self.__log = log.MemLogger(input_path, int(config['main']['log_max_lines']))
 
     def run(self):
-        logging.info('Start: %s -> %s (dryrun: %s)', self.__input_path, self.__output_path, self.__dryrun)
+        try:
+            # Lines of this thread (and of its workers) go to this import log only
+            with self.__log.bind():
+                logging.info('Start: %s -> %s (dryrun: %s)', self.__input_path, self.__output_path, self.__dryrun)
+
+                if not self.__cancel.is_set():
+                    self.__open_journal()
+                    try:
+                        if int(self.__config['main']['pipeline']):
+                            self.__run_pipeline()
+                        else:
+                            self.__run_sequential()
+                    finally:
+                        self.__close_journal()
+
+                if self.__cancel.is_set():
+                    self.__stat['stage'] = 'cancelled'
+                    logging.info('Cancelled: %s', str(self.status()))
+                else:
+                    self.__stat['stage'] = 'done'
+                    logging.info('Done: %s', str(self.status()))
+            self.__log.close()
+        finally:
+            if self.__on_done is not None:
+                self.__on_done(self)
+
+    def __open_journal(self):
+        # In place renames are not journaled, renamed files are skipped anyway
+        if self.__dryrun or not self.__output_path or not int(self.__config['main']['journal']):
+            return
+        name = journal.file_name(self.__config['main']['journal_file'], self.__input_path)
+        self.__journal = journal.Journal(os.path.join(self.__output_path, name))
+
+    def __close_journal(self):
+        if self.__journal is None:
+            return
+        status = self.status()
+        errors = sum(status[stage]['errors'] for stage in ('move', 'rotate') if stage in status)
+        # Kept to resume the import, unless it is complete
+        if self.__cancel.is_set() or errors:
+            self.__journal.close()
+        else:
+            self.__journal.remove()
+        self.__journal = None
+
+    def __unrotated(self):
+        # Images of an interrupted run, transferred but not rotated
+        return self.__journal.unrotated() if self.__journal is not None else []
+
+    def __mover(self, filenames):
+        return mover.Mover(
+            self.__config,
+            self.__output_path,
+            filenames,
+            self.__dryrun,
+            exif_pool=self.__pools.exiftool if self.__pools else None,
+            cancel=self.__cancel,
+            journal=self.__journal,
+            input_path=self.__input_path,
+        )
+
+    def __rotator(self, filenames, orientations):
+        return rotator.Rotator(
+            self.__config,
+            filenames,
+            self.__dryrun,
+            orientations,
+            exif_pool=self.__pools.exiftool if self.__pools else None,
+            executor=self.__pools.rotate_executor if self.__pools else None,
+            cancel=self.__cancel,
+            journal=self.__journal,
+        )
+
+    def __run_sequential(self):
+        if int(self.__config['main']['stream_scan']):
+            dirs = []
+            filenames = self.__scan_iter(self.__input_path, dirs)
+        else:
+            filenames, dirs = self.__scan_files(self.__input_path)
+
+        orientations = {}
+        new_filenames = self.__move_files(filenames, orientations)
+
+        if int(self.__config['main']['remove_empty_dirs']):
+            self.__remove_empty_dirs(dirs)
+
+        self.__rotate_files(new_filenames, orientations)
+
+    def __run_pipeline(self):
+        # Every stage consumes the bounded queue filled by the previous one,
+        # so images are rotated while the rest of files are still moving
+        scan_queue = queue.Queue(self.PIPELINE_QUEUE_SIZE)
+        rotate_queue = queue.Queue(self.PIPELINE_QUEUE_SIZE)
+        orientations = {}
+        dirs = []
 
-        filenames, dirs = self.__scan_files(self.__input_path)
+        logging.info('Moving and rotating')
+        self.__mov = self.__mover(self.__from_queue(scan_queue))
+        rotate_items = self.__from_queue(rotate_queue)
+        self.__rot = self.__rotator(rotate_items, orientations)
+
+        scan_thread = threading.Thread(
+            target=log.propagate(self.__scan_to_queue),
+            args=(self.__scan_iter(self.__input_path, dirs), scan_queue),
+        )
+        rotate_thread = threading.Thread(target=log.propagate(self.__rotate_queued), args=(rotate_items,))
+        scan_thread.start()
+        rotate_thread.start()
+        self.__stat['stage'] = 'move'
 
-        new_filenames = self.__image_filenames(self.__move_files(filenames))
+        try:
+            for new in self.__unrotated():
+                rotate_queue.put(new)
+            for new in self.__image_filenames(self.__mov.run_iter(), orientations):
+                rotate_queue.put(new)
+        finally:
+            rotate_queue.put(None)
+            # Unblock the scanner if the move stage stopped early
+            while scan_thread.is_alive():
+                try:
+                    scan_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
 
         if int(self.__config['main']['remove_empty_dirs']):
             self.__remove_empty_dirs(dirs)
 
-        self.__rotate_files(new_filenames)
+        self.__stat['stage'] = 'rotate'
+        rotate_thread.join()
+
+    def __scan_iter(self, input_path, res_dir):
+        # Files are emitted dir by dir, while 'total' grows with the scan
+        self.__stat['stage'] = 'scan'
+        self.__stat['total'] = 0
+        self.__stat['scan'] = {'processed': 0, 'done': False}
+        return self.__scan_records(input_path, res_dir)
+
+    def __scan_records(self, input_path, res_dir):
+        sort = int(self.__config['main']['scan_sorted'])
+        try:
+            for _, dirs, files in scanner.walk(input_path, self.__on_walk_error, sort):
+                if self.__cancel.is_set():
+                    break
+                self.__stat['total'] += len(files)
+                self.__stat['scan']['processed'] += len(files)
+                yield from files
+                res_dir += dirs
+        finally:
+            self.__stat['scan']['done'] = True
+            logging.info('Found %i files and %i dirs', self.__stat['total'], len(res_dir))
+
+    def __rotate_queued(self, items):
+        try:
+            self.__rot.run()
+        except Exception as ex:
+            logging.exception('Rotate files exception: %s', ex)
+        finally:
+            # The mover blocks on the full queue, unless it is read to the end
+            for _ in items:
+                pass
 
-        self.__stat['stage'] = 'done'
-        logging.info('Done: %s', str(self.status()))
-        self.__log.close()
+    @staticmethod
+    def __scan_to_queue(records, out_queue):
+        try:
+            for record in records:
+                out_queue.put(record)
+        finally:
+            out_queue.put(None)
+
+    @staticmethod
+    def __from_queue(in_queue):
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+            yield item
 
     def __scan_files(self, input_path):
         self.__stat['stage'] = 'scan'
         res_dir = []
         res = []
-        for root, dirs, files in os.walk(input_path, onerror=self.__on_walk_error):
-            for fname in files:
-                res.append(os.path.join(root, fname))
-
-            for dname in dirs:
-                res_dir.append(os.path.join(root, dname))
+        for _, dirs, files in scanner.walk(input_path, self.__on_walk_error):
+            if self.__cancel.is_set():
+                break
+            res += files
+            res_dir += dirs
 
         self.__stat['total'] = len(res)
         res.sort()
@@ -59,30 +230,32 @@ class Importer(threading.Thread):
     def __on_walk_error(self, err):
         logging.error('Scan files error: %s', err)
 
-    def __move_files(self, filenames):
+    def __move_files(self, filenames, orientations):
         logging.info('Moving')
-        self.__mov = mover.Mover(
-            self.__config,
-            self.__output_path,
-            filenames,
-            self.__dryrun,
-        )
+        self.__mov = self.__mover(filenames)
         self.__stat['stage'] = 'move'
 
-        res = self.__mov.run()
-        logging.info('Processed %s files', len(res))
+        # Only new image names are kept for the rotate stage, not the
+        # whole move result
+        res = self.__unrotated()
+        res += self.__image_filenames(self.__mov.run_iter(), orientations)
         return res
 
-    def __image_filenames(self, move_result):
-        res = []
+    @staticmethod
+    def __image_filenames(move_result, orientations):
+        # Transferred files are counted, not skipped ones or errors
+        count = 0
         for _, new, prop in move_result:
+            count += 1
             if prop.type() == fileprop.IMAGE:
-                res.append(new)
-        return res
+                if prop.orientation() is not None:
+                    orientations[new] = prop.orientation()
+                yield new
+        logging.info('Processed %s files', count)
 
-    def __rotate_files(self, filenames):
+    def __rotate_files(self, filenames, orientations):
         logging.info('Rotating')
-        self.__rot = rotator.Rotator(self.__config, filenames, self.__dryrun)
+        self.__rot = self.__rotator(filenames, orientations)
         self.__stat['stage'] = 'rotate'
 
         self.__rot.run()
@@ -97,6 +270,14 @@ class Importer(threading.Thread):
             except OSError:
                 logging.info('Skipped: %s', d)
 
+    def cancel(self):
+        """Stop before the next file, files in progress are finished."""
+        logging.info('Cancel: %s', self.__input_path)
+        self.__cancel.set()
+        if not self.is_alive() and self.__stat['stage'] == '':
+            # Never started, e.g. removed from the scheduler queue
+            self.__stat['stage'] = 'cancelled'
+
     def status(self):
         if self.__mov:
             self.__stat['move'] = self.__mov.status()
@@ -106,5 +287,5 @@ class Importer(threading.Thread):
 
         return self.__stat
 
-    def log_text(self):
-        return self.__log.get_text()
+    def log_text(self, cursor=0):
+        return self.__log.get_text(cursor)
@@ -1,10 +1,16 @@
 #!/usr/bin/python3
+# pylint: disable=unused-argument,too-few-public-methods,too-many-arguments
 
+import io
 import os
+import time
 import unittest
 import tempfile
 
+import pytest
+
 from photo_importer import config
+from photo_importer import rotator
 from photo_importer import importer
 
 
@@ -41,6 +47,7 @@ class TestImporter(unittest.TestCase):
                         'processed': 2,
                         'good': 2,
                         'errors': 0,
+                        'skipped': 2,
                     },
                 },
             )
@@ -61,3 +68,312 @@ class TestImporter(unittest.TestCase):
                 files[1],
                 os.path.join(tmpdirname, 'Foto/2022/2022-11-21/2022-11-21_00-42-07.jpg'),
             )
+
+
+class _FakePopen:
+    def __init__(self, args, **kwargs):
+        self.stderr = io.StringIO('processing ' + args[-1] + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def test_pipeline_import(tmp_path, cfg, fake_exiftool, monkeypatch):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    indir = tmp_path / 'in'
+    (indir / 'sub').mkdir(parents=True)
+    (indir / '2021-12-19_13-11-36.jpg').write_bytes(b'x')
+    (indir / 'sub' / '2022-11-21_00-42-07.mp4').write_bytes(b'x')
+    (indir / 'sub' / 'M0101.CTG').write_bytes(b'x')
+    out = tmp_path / 'out'
+    cfg.set('main', 'pipeline', '1')
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    cfg.set('main', 'time_src_video', 'name')
+
+    imp = importer.Importer(cfg, str(indir), str(out), False)
+    imp.start()
+    imp.join()
+
+    status = imp.status()
+    assert status['stage'] == 'done'
+    assert status['total'] == 3
+    assert status['scan'] == {'processed': 3, 'done': True}
+    assert status['move']['total'] == 3
+    assert status['move']['moved'] == 2
+    assert status['move']['removed'] == 1
+    assert status['rotate'] == {'total': 1, 'processed': 1, 'good': 1, 'errors': 0, 'skipped': 0}
+    assert (out / 'Foto' / '2021' / '2021-12-19' / '2021-12-19_13-11-36.jpg').exists()
+    assert (out / 'Video' / '2022' / '2022-11-21' / '2022-11-21_00-42-07.mp4').exists()
+    assert not (indir / 'sub').exists()
+
+
+def test_stream_scan_import(tmp_path, cfg, fake_exiftool, monkeypatch):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    indir = tmp_path / 'in'
+    for i in range(4):
+        (indir / str(i)).mkdir(parents=True)
+        (indir / str(i) / f'2021-12-19_13-11-3{i}.jpg').write_bytes(b'x')
+    out = tmp_path / 'out'
+    cfg.set('main', 'stream_scan', '1')
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'exif_batch_size', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    imp = importer.Importer(cfg, str(indir), str(out), False)
+    seen = []
+    move = importer.mover.shutil.move
+
+    def move_and_check(src, dst):
+        status = imp.status()
+        seen.append((status['stage'], status['total'], status['scan']['done']))
+        move(src, dst)
+
+    monkeypatch.setattr(importer.mover.shutil, 'move', move_and_check)
+    imp.start()
+    imp.join()
+
+    # the first file is moved before the last dirs are scanned
+    assert seen[0][0] == 'move'
+    assert seen[0][1] < 4
+    assert not seen[0][2]
+    status = imp.status()
+    assert status['stage'] == 'done'
+    assert status['total'] == 4
+    assert status['scan'] == {'processed': 4, 'done': True}
+    assert status['move']['moved'] == 4
+    assert not (indir / '0').exists()
+
+
+@pytest.mark.parametrize('pipeline', ['0', '1'])
+def test_cancel_during_move(tmp_path, cfg, fake_exiftool, monkeypatch, pipeline):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    for i in range(6):
+        (indir / f'2021-12-19_13-11-3{i}.jpg').write_bytes(b'x')
+    out = tmp_path / 'out'
+    cfg.set('main', 'pipeline', pipeline)
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'exif_batch_size', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    imp = importer.Importer(cfg, str(indir), str(out), False)
+    move = importer.mover.shutil.move
+
+    def move_and_cancel(src, dst):
+        move(src, dst)
+        imp.cancel()
+
+    monkeypatch.setattr(importer.mover.shutil, 'move', move_and_cancel)
+    imp.start()
+    imp.join()
+
+    status = imp.status()
+    assert status['stage'] == 'cancelled'
+    assert status['move']['moved'] == 1
+    assert status['move']['processed'] == 1
+    assert status['rotate']['processed'] == 0
+    assert len(list(indir.iterdir())) == 5
+
+
+def test_cancel_before_start(tmp_path, cfg):
+    imp = importer.Importer(cfg, str(tmp_path), str(tmp_path / 'out'), False)
+    imp.cancel()
+    assert imp.status()['stage'] == 'cancelled'
+
+    imp.start()
+    imp.join()
+    assert imp.status()['stage'] == 'cancelled'
+    assert 'move' not in imp.status()
+
+
+def test_resume_from_journal(tmp_path, cfg, fake_exiftool, monkeypatch):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    for i in range(4):
+        (indir / f'2021-12-19_13-11-3{i}.jpg').write_bytes(b'x')
+    out = tmp_path / 'out'
+    cfg.set('main', 'journal', '1')
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'move_mode', '0')
+    cfg.set('main', 'exif_batch_size', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    copy2 = importer.mover.shutil.copy2
+    copied = []
+
+    def copy_and_count(src, dst):
+        copied.append(src)
+        copy2(src, dst)
+
+    def copy_and_stop(src, dst):
+        copy_and_count(src, dst)
+        if len(copied) == 2:
+            imp.cancel()
+
+    # The first run stops after two files
+    imp = importer.Importer(cfg, str(indir), str(out), False)
+    monkeypatch.setattr(importer.mover.shutil, 'copy2', copy_and_stop)
+    imp.start()
+    imp.join()
+    assert imp.status()['stage'] == 'cancelled'
+    assert len(list(out.glob('.photo-importer-*.journal'))) == 1
+
+    monkeypatch.setattr(importer.mover.shutil, 'copy2', copy_and_count)
+    imp = importer.Importer(cfg, str(indir), str(out), False)
+    imp.start()
+    imp.join()
+
+    status = imp.status()
+    assert status['stage'] == 'done'
+    assert status['move']['skipped'] == 2
+    assert status['move']['copied'] == 2
+    assert len(copied) == 4
+    assert len(set(copied)) == 4
+    # Images of the first run are rotated in the resumed one
+    assert status['rotate']['processed'] == 4
+    assert not list(out.rglob('*_2.jpg'))
+    assert not list(out.glob('.photo-importer-*.journal'))
+
+
+def _pipeline_images(tmp_path, cfg, count):
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    for i in range(count):
+        (indir / f'2021-12-19_13-11-{i:02}.jpg').write_bytes(b'x')
+    cfg.set('main', 'pipeline', '1')
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'exif_batch_size', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    return indir
+
+
+def test_pipeline_rotate_error_does_not_block_move(tmp_path, cfg, fake_exiftool, monkeypatch):
+    indir = _pipeline_images(tmp_path, cfg, 8)
+    monkeypatch.setattr(importer.Importer, 'PIPELINE_QUEUE_SIZE', 2)
+
+    def broken(self):
+        raise OSError('no rotate tools')
+
+    monkeypatch.setattr(rotator.Rotator, 'run', broken)
+    imp = importer.Importer(cfg, str(indir), str(tmp_path / 'out'), False)
+    imp.start()
+    imp.join(10)
+
+    assert not imp.is_alive()
+    status = imp.status()
+    assert status['stage'] == 'done'
+    assert status['move']['moved'] == 8
+
+
+class _SlowPopen(_FakePopen):
+    def __init__(self, args, **kwargs):
+        time.sleep(0.1)
+        super().__init__(args, **kwargs)
+
+
+def test_pipeline_cancel_with_full_rotate_queue(tmp_path, cfg, fake_exiftool, monkeypatch):
+    indir = _pipeline_images(tmp_path, cfg, 12)
+    cfg.set('main', 'use_jpegtran', '0')
+    cfg.set('main', 'threads_count', '1')
+    monkeypatch.setattr(importer.Importer, 'PIPELINE_QUEUE_SIZE', 2)
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _SlowPopen)
+    imp = importer.Importer(cfg, str(indir), str(tmp_path / 'out'), False)
+    move = importer.mover.shutil.move
+    moved = []
+
+    def move_and_cancel(src, dst):
+        move(src, dst)
+        moved.append(src)
+        # Rotation is slower, so the rotate queue is full by now
+        if len(moved) == 6:
+            imp.cancel()
+
+    monkeypatch.setattr(importer.mover.shutil, 'move', move_and_cancel)
+    imp.start()
+    imp.join(10)
+
+    assert not imp.is_alive()
+    status = imp.status()
+    assert status['stage'] == 'cancelled'
+    assert status['move']['moved'] == 6
+    assert status['rotate']['processed'] < 6
+
+
+def test_journal_per_source(tmp_path, cfg, fake_exiftool, monkeypatch):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    out = tmp_path / 'out'
+    cfg.set('main', 'journal', '1')
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    indirs = []
+    for i in range(2):
+        indir = tmp_path / f'card{i}'
+        indir.mkdir()
+        (indir / f'2021-12-19_13-11-3{i}.jpg').write_bytes(b'x')
+        indirs.append(indir)
+    (indirs[0] / '2021-12-19_13-11-40.jpg').write_bytes(b'x')
+
+    # The failed import keeps its journal, when the other one completes
+    move = importer.mover.shutil.move
+
+    def move_or_fail(src, dst):
+        if src.endswith('40.jpg'):
+            raise OSError('broken card')
+        move(src, dst)
+
+    monkeypatch.setattr(importer.mover.shutil, 'move', move_or_fail)
+    for indir in indirs:
+        imp = importer.Importer(cfg, str(indir), str(out), False)
+        imp.start()
+        imp.join()
+
+    assert [p.name for p in out.glob('.photo-importer-*.journal')] == [
+        importer.journal.file_name('.photo-importer.journal', str(indirs[0]))
+    ]
+
+
+def test_rename_in_place_not_journaled(tmp_path, cfg, fake_exiftool, monkeypatch):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    (indir / 'IMG_1.jpg').write_bytes(b'x')
+    cfg.set('main', 'journal', '1')
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'time_src_image', 'attr')
+
+    imp = importer.Importer(cfg, str(indir), '', False)
+    imp.start()
+    imp.join()
+
+    assert imp.status()['stage'] == 'done'
+    assert not list(indir.glob('.photo-importer*'))
+
+
+@pytest.mark.parametrize('pipeline', ['0', '1'])
+def test_processed_log_counts_transferred(tmp_path, cfg, fake_exiftool, monkeypatch, caplog, pipeline):
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    for i in range(3):
+        (indir / f'2021-12-19_13-11-3{i}.jpg').write_bytes(b'x')
+    cfg.set('main', 'pipeline', pipeline)
+    cfg.set('main', 'use_shutil', '1')
+    cfg.set('main', 'time_src_image', 'name')
+    move = importer.mover.shutil.move
+
+    def move_or_fail(src, dst):
+        if src.endswith('30.jpg'):
+            raise OSError('broken card')
+        move(src, dst)
+
+    monkeypatch.setattr(importer.mover.shutil, 'move', move_or_fail)
+    caplog.set_level('INFO')
+    imp = importer.Importer(cfg, str(indir), str(tmp_path / 'out'), False)
+    imp.start()
+    imp.join()
+
+    assert imp.status()['move']['errors'] == 1
+    assert 'Processed 2 files' in caplog.messages
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+
+def file_name(name, input_path):
+    """Journal file name of one input path, e.g. name-<hash>.journal.
+
+    Imports of several sources to one output path get their own journals.
+    """
+    base, ext = os.path.splitext(name)
+    digest = hashlib.sha1(os.path.realpath(input_path).encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+    return f'{base}-{digest}{ext}'
+
+
+class Journal:
+    """Append-only log of completed files, to resume interrupted imports.
+
+    Every transferred file is written as one JSON line with its source
+    (path, size, mtime_ns) and destination, rotated images as another
+    line. On resume, sources with the same size and mtime are skipped,
+    and journaled images which were not rotated yet are rotated.
+    A torn last line of a killed process is ignored.
+    """
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__lock = threading.Lock()
+        self.__done = {}  # src: (size, mtime_ns)
+        self.__unrotated = {}  # dst: None, ordered
+        self.__file = None
+        self.__load()
+
+    def __load(self):
+        try:
+            with open(self.__filename, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logging.warning('journal (%s): broken line skipped', self.__filename)
+                        continue
+                    if 'rotated' in entry:
+                        self.__unrotated.pop(entry['rotated'], None)
+                        continue
+                    self.__done[entry['src']] = (entry['size'], entry['mtime_ns'])
+                    if entry['image']:
+                        self.__unrotated[entry['dst']] = None
+        except FileNotFoundError:
+            return
+        logging.info('journal (%s): %i files done before', self.__filename, len(self.__done))
+
+    def __write(self, entry):
+        line = json.dumps(entry) + '\n'
+        with self.__lock:
+            if self.__file is None:
+                dir_part = os.path.split(self.__filename)[0]
+                if dir_part:
+                    os.makedirs(dir_part, exist_ok=True)
+                self.__file = open(self.__filename, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+            self.__file.write(line)
+            # Lines must survive a killed process, not only a clean exit
+            self.__file.flush()
+
+    def done(self, path, size, mtime_ns):
+        """Was the source transferred before, unchanged since then."""
+        return self.__done.get(path) == (size, mtime_ns)
+
+    def unrotated(self):
+        """Journaled images, which were transferred but not rotated."""
+        return list(self.__unrotated)
+
+    def add(self, src, dst, size, mtime_ns, image):
+        self.__write({'src': src, 'dst': dst, 'size': size, 'mtime_ns': mtime_ns, 'image': image})
+
+    def rotated(self, dst):
+        self.__write({'rotated': dst})
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+    def remove(self):
+        """Remove the journal of a completed import."""
+        self.close()
+        try:
+            os.remove(self.__filename)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+
+from photo_importer import journal
+
+
+def test_entries_survive_reopen(tmp_path):
+    fname = str(tmp_path / 'out' / 'j')
+    j = journal.Journal(fname)
+    assert not j.done('/in/a.jpg', 1, 2)
+    j.add('/in/a.jpg', '/out/a.jpg', 1, 2, True)
+    j.add('/in/b.mp4', '/out/b.mp4', 3, 4, False)
+    j.add('/in/c.jpg', '/out/c.jpg', 5, 6, True)
+    j.rotated('/out/a.jpg')
+
+    # Written lines are on disk before close, as after a killed process
+    j2 = journal.Journal(fname)
+    assert j2.done('/in/a.jpg', 1, 2)
+    assert j2.done('/in/b.mp4', 3, 4)
+    assert not j2.done('/in/b.mp4', 3, 5)  # modified since
+    assert j2.unrotated() == ['/out/c.jpg']
+    j.close()
+
+
+def test_torn_line_ignored(tmp_path):
+    fname = tmp_path / 'j'
+    j = journal.Journal(str(fname))
+    j.add('/in/a.jpg', '/out/a.jpg', 1, 2, False)
+    j.close()
+    with open(fname, 'a', encoding='utf-8') as f:
+        f.write('{"src": "/in/b.jpg", "ds')
+
+    j = journal.Journal(str(fname))
+    assert j.done('/in/a.jpg', 1, 2)
+    assert not j.done('/in/b.jpg', 1, 2)
+
+
+def test_remove(tmp_path):
+    fname = tmp_path / 'j'
+    j = journal.Journal(str(fname))
+    j.remove()
+    j.add('/in/a.jpg', '/out/a.jpg', 1, 2, False)
+    assert fname.exists()
+    j.remove()
+    assert not fname.exists()
+
+
+def test_file_name_per_source(tmp_path):
+    (tmp_path / 'card1').mkdir()
+    (tmp_path / 'card2').mkdir()
+    (tmp_path / 'link').symlink_to(tmp_path / 'card1')
+
+    name1 = journal.file_name('.j.journal', str(tmp_path / 'card1'))
+    name2 = journal.file_name('.j.journal', str(tmp_path / 'card2'))
+
+    assert name1.startswith('.j-') and name1.endswith('.journal')
+    assert name1 != name2
+    assert journal.file_name('.j.journal', str(tmp_path / 'link')) == name1
@@ -1,7 +1,11 @@
-import io
 import os
 import sys
 import logging
+import functools
+import itertools
+import threading
+import contextlib
+import collections
 
 LOGFMT = '[%(asctime)s] [%(levelname)s] %(message)s'
 DATEFMT = '%Y-%m-%d %H:%M:%S'
@@ -30,24 +34,122 @@ def init_logger(filename=None, level=logging.INFO):
     logging.debug(str(sys.argv))
 
 
+class _RingHandler(logging.Handler):
+    def __init__(self, max_lines):
+        super().__init__()
+        self.__lines = collections.deque(maxlen=max_lines)
+        # Number of lines ever emitted, so cursors stay valid after rotation
+        self.__count = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self.__lines.append(line)
+            self.__count += 1
+
+    def lines(self, cursor=0):
+        with self.lock:
+            first = self.__count - len(self.__lines)
+            start = max(cursor, first) - first
+            return list(itertools.islice(self.__lines, start, None)), self.__count
+
+
+# MemLogger of the import the current thread works for
+_context = threading.local()
+_dispatcher_lock = threading.Lock()
+_dispatcher = None  # pylint: disable=invalid-name
+
+
+class _Dispatcher(logging.Handler):
+    """The only root handler for all MemLoggers, it passes each record to
+    the MemLogger bound to the emitting thread."""
+
+    def emit(self, record):
+        mem_logger = current()
+        if mem_logger is not None:
+            mem_logger.handle(record)
+
+
+def current():
+    return getattr(_context, 'mem_logger', None)
+
+
+def bind_thread(mem_logger):
+    """Bind the calling thread to mem_logger, e.g. as an executor initializer."""
+    _context.mem_logger = mem_logger
+
+
+@contextlib.contextmanager
+def bound(mem_logger):
+    prev = current()
+    bind_thread(mem_logger)
+    try:
+        yield
+    finally:
+        bind_thread(prev)
+
+
+def propagate(func):
+    """Wrap func to run it in the log context of the caller, e.g. in a new thread."""
+    mem_logger = current()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with bound(mem_logger):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def executor_args():
+    """ThreadPoolExecutor kwargs, which keep the log context in worker threads."""
+    return {'initializer': bind_thread, 'initargs': (current(),)}
+
+
+def _install_dispatcher():
+    global _dispatcher  # pylint: disable=global-statement
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = _Dispatcher()
+            logging.getLogger().addHandler(_dispatcher)
+
+
 class MemLogger:
-    def __init__(self, name):
+    """Keeps the last max_lines lines of the log of threads bound to it."""
+
+    DEFAULT_MAX_LINES = 10000
+
+    def __init__(self, name, max_lines=DEFAULT_MAX_LINES):
         self.__name = name
         fmt = logging.Formatter(LOGFMT, DATEFMT)
-        self.__stream = io.StringIO()
-        self.__handler = logging.StreamHandler(self.__stream)
-        self.__handler.setFormatter(fmt)
-        logging.getLogger().addHandler(self.__handler)
-        logging.info("MemLogger %s started", self.__name)
+        self.__ring = _RingHandler(max_lines)
+        self.__ring.setFormatter(fmt)
+        self.__closed = False
+        _install_dispatcher()
+        with self.bind():
+            logging.info("MemLogger %s started", self.__name)
+
+    def bind(self):
+        return bound(self)
+
+    def handle(self, record):
+        if not self.__closed:
+            self.__ring.handle(record)
 
     def close(self):
-        if self.__handler is not None:
-            logging.info("MemLogger %s finished", self.__name)
-            logging.getLogger().removeHandler(self.__handler)
-            self.__handler = None
+        if not self.__closed:
+            with self.bind():
+                logging.info("MemLogger %s finished", self.__name)
+            self.__closed = True
 
     def __del__(self):
         self.close()
 
-    def get_text(self):
-        return self.__stream.getvalue()
+    def get_text(self, cursor=0):
+        """Return (text of lines after cursor, cursor for the next call)."""
+        lines, cursor = self.__ring.lines(cursor)
+        return ''.join(line + '\n' for line in lines), cursor
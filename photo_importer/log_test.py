@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+import logging
+import threading
+import concurrent.futures
+
+from photo_importer import log
+
+
+def test_mem_logger_keeps_last_lines(caplog):
+    caplog.set_level(logging.INFO)
+    ml = log.MemLogger('test', max_lines=3)
+    with ml.bind():
+        for i in range(5):
+            logging.warning('line %d', i)
+    ml.close()
+
+    text, cursor = ml.get_text()
+    lines = text.splitlines()
+    assert len(lines) == 3
+    assert lines[0].endswith('line 3')
+    assert lines[2].endswith('finished')
+    assert cursor == 7  # started, 5 lines, finished
+
+
+def test_mem_logger_cursor():
+    ml = log.MemLogger('test', max_lines=100)
+    with ml.bind():
+        _, cursor = ml.get_text()
+        logging.warning('first')
+        text, cursor = ml.get_text(cursor)
+        assert text.endswith('first\n')
+        assert text.count('\n') == 1
+
+        assert ml.get_text(cursor) == ('', cursor)
+
+        logging.warning('second')
+        text, cursor = ml.get_text(cursor)
+        assert text.endswith('second\n')
+        assert text.count('\n') == 1
+    ml.close()
+
+
+def test_mem_logger_stale_cursor_gets_oldest_kept():
+    ml = log.MemLogger('test', max_lines=2)
+    with ml.bind():
+        for i in range(5):
+            logging.warning('line %d', i)
+    text, _ = ml.get_text(1)
+    ml.close()
+
+    assert text.splitlines()[0].endswith('line 3')
+
+
+def test_mem_loggers_are_isolated():
+    ml1 = log.MemLogger('one')
+    ml2 = log.MemLogger('two')
+
+    def work(ml, name):
+        with ml.bind():
+            logging.warning('from %s', name)
+
+    threads = [threading.Thread(target=work, args=(ml, name)) for ml, name in ((ml1, 'one'), (ml2, 'two'))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logging.warning('unbound')
+
+    text1 = ml1.get_text()[0]
+    text2 = ml2.get_text()[0]
+    assert 'from one' in text1 and 'from two' not in text1
+    assert 'from two' in text2 and 'from one' not in text2
+    assert 'unbound' not in text1 + text2
+
+
+def test_context_propagates_to_workers():
+    ml = log.MemLogger('test')
+    with ml.bind():
+        thread = threading.Thread(target=log.propagate(logging.warning), args=('from thread',))
+        thread.start()
+        thread.join()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2, **log.executor_args()) as executor:
+            executor.submit(logging.warning, 'from pool').result()
+    assert log.current() is None
+
+    text = ml.get_text()[0]
+    assert 'from thread' in text
+    assert 'from pool' in text
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+import os
+import time
+import sqlite3
+import logging
+import datetime
+import threading
+
+
+class MetaCache:
+    """Persistent cache of resolved file times.
+
+    Entries are keyed by (realpath, st_size, st_mtime_ns), so any change of
+    a file invalidates its entry. The least recently used entries are
+    evicted on close when the cache grows over max_entries.
+    """
+
+    COMMIT_EVERY = 1000
+    SCHEMA_VERSION = 2
+
+    def __init__(self, filename, max_entries):
+        self.__filename = filename
+        self.__max_entries = max_entries
+        self.__db = None
+        self.__pending = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def key(fullname, record=None, realname=None):
+        # record is anything with size and mtime_ns, e.g. a scanner record,
+        # realname is the already resolved path, if the caller knows it
+        if realname is None:
+            realname = os.path.realpath(fullname)
+        if record is not None:
+            return (realname, record.size, record.mtime_ns)
+        try:
+            st = os.stat(fullname)
+        except OSError:
+            return None
+        return (realname, st.st_size, st.st_mtime_ns)
+
+    def __connect(self):
+        if self.__db is None:
+            dir_part = os.path.split(self.__filename)[0]
+            if dir_part:
+                os.makedirs(dir_part, exist_ok=True)
+            self.__db = sqlite3.connect(self.__filename, timeout=30, check_same_thread=False)
+            if self.__db.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+                # Cached values are cheap to rebuild, so old schemas are just dropped
+                self.__db.execute('DROP TABLE IF EXISTS files')
+                self.__db.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+            self.__db.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                'type INTEGER, time TEXT, orientation INTEGER, atime REAL)'
+            )
+            self.__db.execute('CREATE INDEX IF NOT EXISTS files_atime ON files (atime)')
+        return self.__db
+
+    def __modified(self):
+        self.__pending += 1
+        if self.__pending >= self.COMMIT_EVERY:
+            self.__db.commit()
+            self.__pending = 0
+
+    def get(self, key):
+        path, size, mtime_ns = key
+        with self.__lock:
+            try:
+                db = self.__connect()
+                row = db.execute(
+                    'SELECT type, time, orientation FROM files WHERE path=? AND size=? AND mtime_ns=?',
+                    (path, size, mtime_ns),
+                ).fetchone()
+                if row is None:
+                    return None
+                db.execute('UPDATE files SET atime=? WHERE path=?', (time.time(), path))
+                self.__modified()
+            except (sqlite3.Error, OSError) as ex:
+                logging.warning('metadata cache (%s) error: %s', self.__filename, ex)
+                return None
+
+        tp, ftime, orientation = row
+        return tp, datetime.datetime.fromisoformat(ftime) if ftime else None, orientation
+
+    def put(self, key, tp, ftime, orientation=None):
+        path, size, mtime_ns = key
+        with self.__lock:
+            try:
+                self.__connect().execute(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (path, size, mtime_ns, tp, ftime.isoformat() if ftime else None, orientation, time.time()),
+                )
+                self.__modified()
+            except (sqlite3.Error, OSError) as ex:
+                logging.warning('metadata cache (%s) error: %s', self.__filename, ex)
+
+    def close(self):
+        with self.__lock:
+            if self.__db is None:
+                return
+            try:
+                self.__db.execute(
+                    'DELETE FROM files WHERE path IN '
+                    '(SELECT path FROM files ORDER BY atime DESC LIMIT -1 OFFSET ?)',
+                    (self.__max_entries,),
+                )
+                self.__db.commit()
+            except (sqlite3.Error, OSError) as ex:
+                logging.warning('metadata cache (%s) error: %s', self.__filename, ex)
+            finally:
+                self.__db.close()
+                self.__db = None
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+import sqlite3
+import datetime
+
+from photo_importer import metacache
+
+
+def _file(tmp_path, name, data=b'data'):
+    p = tmp_path / name
+    p.write_bytes(data)
+    return str(p)
+
+
+def test_put_get(tmp_path):
+    fname = _file(tmp_path, 'a.jpg')
+    cache = metacache.MetaCache(str(tmp_path / 'db' / 'cache.db'), 10)
+    key = cache.key(fname)
+    ftime = datetime.datetime(2020, 5, 1, 12, 0, 0)
+
+    assert cache.get(key) is None
+    cache.put(key, 1, ftime, 6)
+    assert cache.get(key) == (1, ftime, 6)
+    cache.close()
+
+    cache = metacache.MetaCache(str(tmp_path / 'db' / 'cache.db'), 10)
+    assert cache.get(key) == (1, ftime, 6)
+    cache.close()
+
+
+def test_missing_time_is_cached(tmp_path):
+    fname = _file(tmp_path, 'a.jpg')
+    cache = metacache.MetaCache(str(tmp_path / 'cache.db'), 10)
+    cache.put(cache.key(fname), 1, None)
+    assert cache.get(cache.key(fname)) == (1, None, None)
+
+
+def test_changed_file_invalidates(tmp_path):
+    fname = _file(tmp_path, 'a.jpg')
+    cache = metacache.MetaCache(str(tmp_path / 'cache.db'), 10)
+    cache.put(cache.key(fname), 1, datetime.datetime(2020, 5, 1))
+
+    with open(fname, 'ab') as f:
+        f.write(b'more')
+
+    assert cache.get(cache.key(fname)) is None
+
+
+def test_old_schema_is_dropped(tmp_path):
+    fname = _file(tmp_path, 'a.jpg')
+    with sqlite3.connect(str(tmp_path / 'cache.db')) as db:
+        db.execute('CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, type INTEGER, time TEXT, atime REAL)')
+
+    cache = metacache.MetaCache(str(tmp_path / 'cache.db'), 10)
+    cache.put(cache.key(fname), 1, None, 1)
+    assert cache.get(cache.key(fname)) == (1, None, 1)
+    cache.close()
+
+
+def test_missing_file_has_no_key(tmp_path):
+    assert metacache.MetaCache.key(str(tmp_path / 'nope.jpg')) is None
+
+
+def test_eviction_keeps_recent(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(metacache.time, 'time', lambda: next(clock))
+    dbname = str(tmp_path / 'cache.db')
+    cache = metacache.MetaCache(dbname, 2)
+    keys = [cache.key(_file(tmp_path, f'{i}.jpg')) for i in range(3)]
+    for key in keys:
+        cache.put(key, 1, None)
+    cache.get(keys[0])
+    cache.close()
+
+    cache = metacache.MetaCache(dbname, 2)
+    assert cache.get(keys[0]) == (1, None, None)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == (1, None, None)
+    cache.close()
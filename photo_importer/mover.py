@@ -4,8 +4,16 @@
 import os
 import shutil
 import logging
+import itertools
+import threading
+import contextlib
 import subprocess
+import collections
+import concurrent.futures
 
+from photo_importer import log
+from photo_importer import copier
+from photo_importer import scanner
 from photo_importer import fileprop
 
 
@@ -16,45 +24,148 @@ class Mover:
         fileprop.AUDIO: 'out_subdir_audio',
     }
 
-    def __init__(self, config, output_path, filenames, dryrun):
+    def __init__(
+        self, config, output_path, filenames, dryrun, exif_pool=None, cancel=None, journal=None, input_path=None
+    ):
         self.__config = config
         self.__output_path = output_path
         self.__filenames = filenames
         self.__dryrun = dryrun
+        # Set to stop before the next file, started transfers are finished
+        self.__cancel = cancel if cancel is not None else threading.Event()
+        # Completed files of an interrupted run are skipped, new ones added
+        self.__journal = journal
+        # Source (size, mtime_ns) by path, until the file is journaled
+        self.__journal_stat = {}
         self.__move_mode = int(config['main']['move_mode'])
         self.__remove_garbage = int(config['main']['remove_garbage'])
         self.__umask = int(config['main']['umask'], 8)
         self.__use_shutil = int(config['main']['use_shutil'])
-        self.__stat = {'total': len(filenames)}
-        self.__file_prop = fileprop.FileProp(self.__config)
+        self.__use_native_copy = int(config['main']['use_native_copy'])
+        self.__copy_buffer_size = int(config['main']['copy_buffer_size'])
+        self.__exif_batch_size = int(config['main']['exif_batch_size'])
+        self.__copy_workers = max(1, int(config['main']['copy_workers']))
+        # (limit, semaphore by st_dev) for source and destination devices
+        self.__src_limits = (int(config['main']['copy_src_device_limit']), {})
+        self.__dst_limits = (int(config['main']['copy_dst_device_limit']), {})
+        self.__lock = threading.Lock()
+        # Output dirs which are already checked or created
+        self.__known_dirs = set()
+        self.__stat = {
+            'total': len(filenames) if hasattr(filenames, '__len__') else 0,
+            'moved': 0,
+            'copied': 0,
+            'removed': 0,
+            'skipped': 0,
+            'processed': 0,
+            'errors': 0,
+        }
+        self.__file_prop = fileprop.FileProp(self.__config, exif_pool, input_path)
 
     def run(self):
+        return list(self.run_iter())
+
+    def run_iter(self):
         os.umask(self.__umask)
-        self.__stat['moved'] = 0
-        self.__stat['copied'] = 0
-        self.__stat['removed'] = 0
-        self.__stat['skipped'] = 0
-        self.__stat['processed'] = 0
-        self.__stat['errors'] = 0
-        res = []
+        executor = None
+        if self.__copy_workers > 1:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.__copy_workers, **log.executor_args())
         try:
-            for fname in self.__filenames:
-                try:
-                    prop = self.__file_prop.get(fname)
-                    new_fname = self.__move_file(fname, prop)
-                    if new_fname:
-                        res.append((fname, new_fname, prop))
-                except Exception as ex:
-                    logging.error('Move files exception: %s', ex)
-                    self.__stat['errors'] += 1
+            # Names and dirs are prepared here, so only transfers run in parallel
+            pending = collections.deque()
+            props = self.__file_prop.get_many(self.__counted(self.__filenames), self.__exif_batch_size)
+            while not self.__cancel.is_set():
+                batch = list(itertools.islice(props, self.__exif_batch_size))
+                if not batch:
+                    break
+                self.__make_dirs(batch)
+                for fname, prop in batch:
+                    if self.__cancel.is_set():
+                        logging.info('Move cancelled')
+                        break
+                    pending.append((fname, prop, self.__start(executor, fname, prop)))
+                    while pending and (len(pending) > self.__copy_workers * 2 or self.__ready(pending[0][2])):
+                        yield from self.__finish(*pending.popleft())
 
-                self.__stat['processed'] += 1
+            while pending:
+                yield from self.__finish(*pending.popleft())
+            props.close()
         finally:
+            if executor is not None:
+                executor.shutdown()
             self.__file_prop.close()
 
-        return res
+    def __counted(self, filenames):
+        for i, fname in enumerate(filenames, 1):
+            if self.__cancel.is_set():
+                break
+            self.__stat['total'] = max(self.__stat['total'], i)
+            if self.__journal is not None:
+                path, size_mtime = self.__source_stat(fname)
+                if size_mtime is not None and self.__journal.done(path, *size_mtime):
+                    logging.debug('journaled: %s', path)
+                    self.__stat['skipped'] += 1
+                    self.__stat['processed'] += 1
+                    continue
+                self.__journal_stat[path] = size_mtime
+            yield fname
+
+    @staticmethod
+    def __source_stat(fname):
+        record = scanner.record_of(fname)
+        if record is not None:
+            return record.path, (record.size, record.mtime_ns)
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return fname, None
+        return fname, (st.st_size, st.st_mtime_ns)
+
+    def __start(self, executor, fname, prop):
+        if prop is None:
+            return None
+
+        future = concurrent.futures.Future()
+        try:
+            fullname = self.__target(fname, prop)
+            if fullname is None:
+                future.set_result(None)
+            elif executor is None:
+                future.set_result(self.__transfer(fname, fullname))
+            else:
+                future = executor.submit(self.__transfer, fname, fullname)
+        except Exception as ex:
+            future.set_exception(ex)
+        return future
+
+    @staticmethod
+    def __ready(future):
+        return future is None or future.done()
+
+    def __finish(self, fname, prop, future):
+        new_fname = None
+        if future is None:
+            self.__stat['errors'] += 1
+        else:
+            try:
+                new_fname = future.result()
+            except Exception as ex:
+                logging.error('Move files exception: %s', ex)
+                self.__stat['errors'] += 1
+
+        self.__stat['processed'] += 1
+        size_mtime = self.__journal_stat.pop(fname, None)
+        if new_fname:
+            if size_mtime is not None and not self.__dryrun:
+                try:
+                    self.__journal.add(fname, new_fname, *size_mtime, prop.type() == fileprop.IMAGE)
+                except OSError as ex:
+                    # The file is transferred, only a resume would redo it
+                    logging.error('Journal (%s) error: %s', fname, ex)
+                    self.__stat['errors'] += 1
+            yield fname, new_fname, prop
 
-    def __move_file(self, fname, prop):
+    def __target(self, fname, prop):
         if prop.type() == fileprop.GARBAGE:
             if self.__remove_garbage:
                 if not self.__dryrun:
@@ -70,41 +181,89 @@ class Mover:
             return None
 
         if self.__output_path:
-            path = prop.time().strftime(
-                os.path.join(
-                    self.__output_path,
-                    self.__config['main'][self.OUT_SUBDIR_CFG[prop.type()]],
-                    self.__config['main']['out_date_format'],
-                )
+            path = self.__out_dir(prop)
+            self.__make_dir(path)
+            return prop.out_name_full(path)
+
+        if prop.ok():
+            self.__stat['skipped'] += 1
+            return None
+
+        return prop.out_name_full()
+
+    def __out_dir(self, prop):
+        return prop.time().strftime(
+            os.path.join(
+                self.__output_path,
+                self.__config['main'][self.OUT_SUBDIR_CFG[prop.type()]],
+                self.__config['main']['out_date_format'],
             )
+        )
 
-            if not os.path.isdir(path):
-                if not self.__dryrun:
-                    os.makedirs(path, exist_ok=True)
-                logging.info('dir "%s" created', path)
+    def __make_dirs(self, batch):
+        # Parents go first, so makedirs does not stat them again
+        if not self.__output_path:
+            return
+        dirs = set()
+        for _, prop in batch:
+            if prop is not None and prop.type() in self.OUT_SUBDIR_CFG and prop.time() is not None:
+                dirs.add(self.__out_dir(prop))
+        for path in sorted(dirs - self.__known_dirs):
+            try:
+                self.__make_dir(path)
+            except OSError as ex:
+                logging.error('Create dir "%s" error: %s', path, ex)
 
-            fullname = prop.out_name_full(path)
-            if self.__move_mode:
+    def __make_dir(self, path):
+        if path in self.__known_dirs:
+            return
+        if not os.path.isdir(path):
+            if not self.__dryrun:
+                os.makedirs(path, exist_ok=True)
+            logging.info('dir "%s" created', path)
+        self.__known_dirs.add(path)
+
+    def __transfer(self, fname, fullname):
+        with self.__device_slots(fname, fullname):
+            if not self.__output_path:
+                if not self.__dryrun:
+                    os.rename(fname, fullname)
+                logging.info('"%s" renamed "%s"', fname, fullname)
+                counter = 'moved'
+            elif self.__move_mode:
                 self.__move(fname, fullname)
                 logging.info('"%s" moved "%s"', fname, fullname)
-                self.__stat['moved'] += 1
+                counter = 'moved'
             else:
                 self.__copy(fname, fullname)
                 logging.info('"%s" copied "%s"', fname, fullname)
-                self.__stat['copied'] += 1
+                counter = 'copied'
 
-            return fullname
+        with self.__lock:
+            self.__stat[counter] += 1
+        return fullname
 
-        if prop.ok():
-            self.__stat['skipped'] += 1
+    @contextlib.contextmanager
+    def __device_slots(self, src, dst):
+        # Source slots are always taken before destination ones, so
+        # workers waiting for each other can not deadlock
+        with contextlib.ExitStack() as stack:
+            for limits, path in ((self.__src_limits, src), (self.__dst_limits, os.path.dirname(dst))):
+                slot = self.__device_slot(limits, path)
+                if slot is not None:
+                    stack.enter_context(slot)
+            yield
+
+    def __device_slot(self, limits, path):
+        limit, slots = limits
+        if limit <= 0:
             return None
 
-        new_fname = prop.out_name_full()
-        if not self.__dryrun:
-            os.rename(fname, new_fname)
-        logging.info('"%s" renamed "%s"', fname, new_fname)
-        self.__stat['moved'] += 1
-        return new_fname
+        dev = scanner.device(path)
+        with self.__lock:
+            if dev not in slots:
+                slots[dev] = threading.BoundedSemaphore(limit)
+            return slots[dev]
 
     def __move(self, src, dst):
         if self.__dryrun:
@@ -118,7 +277,9 @@ class Mover:
     def __copy(self, src, dst):
         if self.__dryrun:
             return
-        if self.__use_shutil:
+        if self.__use_native_copy:
+            copier.copy(src, dst, self.__copy_buffer_size)
+        elif self.__use_shutil:
             shutil.copy2(src, dst)
         else:
             if not self.__run(["cp", "-a", src, dst]):
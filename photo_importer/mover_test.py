@@ -2,6 +2,8 @@
 # pylint: disable=redefined-outer-name,unused-argument,too-few-public-methods
 
 import os
+import time
+import threading
 
 import pytest
 
@@ -91,6 +93,22 @@ def test_subprocess_copy_with_cp(tmp_path, cfg_name, fake_exiftool):
     assert m.status()['copied'] == 1
 
 
+def test_native_copy(tmp_path, cfg_name, fake_exiftool, monkeypatch):
+    src = _file(tmp_path)
+    os.utime(src, (1590969600, 1590969600))
+    cfg_name.set('main', 'use_native_copy', '1')
+    cfg_name.set('main', 'move_mode', '0')
+    monkeypatch.setattr(mover.subprocess, 'Popen', None)  # cp is not used
+    out = tmp_path / 'out'
+
+    m = mover.Mover(cfg_name, str(out), [src], dryrun=False)
+    m.run()
+
+    assert _dst(out).read_bytes() == b'data'
+    assert os.stat(_dst(out)).st_mtime == 1590969600
+    assert m.status()['copied'] == 1
+
+
 # --- garbage ---
 
 
@@ -181,3 +199,140 @@ def test_mv_failure_counts_error(tmp_path, cfg_name, fake_exiftool):
     m.run()
 
     assert m.status()['errors'] == 1
+
+
+# --- parallel transfers ---
+
+
+def test_parallel_copy_workers(tmp_path, cfg_name, fake_exiftool, monkeypatch):
+    names = [_file(tmp_path, f'2021-12-19_13-11-3{i}.jpg') for i in range(3)]
+    cfg_name.set('main', 'use_shutil', '1')
+    cfg_name.set('main', 'move_mode', '0')
+    cfg_name.set('main', 'copy_workers', '3')
+    barrier = threading.Barrier(3)
+    copy2 = mover.shutil.copy2
+
+    def copy_together(src, dst):
+        barrier.wait(timeout=5)  # fails unless all files are copied at once
+        copy2(src, dst)
+
+    monkeypatch.setattr(mover.shutil, 'copy2', copy_together)
+    m = mover.Mover(cfg_name, str(tmp_path / 'out'), names, dryrun=False)
+    res = m.run()
+
+    assert [r[0] for r in res] == names
+    assert m.status()['copied'] == 3
+    assert m.status()['errors'] == 0
+
+
+def test_parallel_names_are_unique(tmp_path, cfg_name, fake_exiftool):
+    names = []
+    for i in range(8):
+        (tmp_path / str(i)).mkdir()
+        names.append(_file(tmp_path / str(i)))
+    cfg_name.set('main', 'use_shutil', '1')
+    cfg_name.set('main', 'move_mode', '0')
+    cfg_name.set('main', 'copy_workers', '4')
+    out = tmp_path / 'out'
+
+    res = mover.Mover(cfg_name, str(out), names, dryrun=False).run()
+
+    dst_dir = _dst(out).parent
+    assert sorted(r[1] for r in res) == sorted(
+        [str(_dst(out))] + [str(dst_dir / f'2021-12-19_13-11-36_{i}.jpg') for i in range(2, 9)]
+    )
+    assert len(os.listdir(dst_dir)) == 8
+
+
+def test_device_limit(tmp_path, cfg_name, fake_exiftool, monkeypatch):
+    names = [_file(tmp_path, f'2021-12-19_13-11-3{i}.jpg') for i in range(6)]
+    cfg_name.set('main', 'use_shutil', '1')
+    cfg_name.set('main', 'move_mode', '0')
+    cfg_name.set('main', 'copy_workers', '4')
+    cfg_name.set('main', 'copy_src_device_limit', '1')
+    active = []
+    copy2 = mover.shutil.copy2
+
+    def copy_one(src, dst):
+        active.append(src)
+        assert len(active) == 1
+        time.sleep(0.01)
+        copy2(src, dst)
+        active.remove(src)
+
+    monkeypatch.setattr(mover.shutil, 'copy2', copy_one)
+    m = mover.Mover(cfg_name, str(tmp_path / 'out'), names, dryrun=False)
+    m.run()
+
+    assert m.status()['copied'] == 6
+    assert m.status()['errors'] == 0
+
+
+# --- output dirs ---
+
+
+def test_output_dirs_checked_once(tmp_path, cfg_name, fake_exiftool, monkeypatch):
+    names = [_file(tmp_path, f'2021-12-{d}_13-11-3{i}.jpg') for d in (20, 19) for i in range(3)]
+    cfg_name.set('main', 'use_shutil', '1')
+    cfg_name.set('main', 'move_mode', '0')
+    created = []
+    makedirs = os.makedirs
+    monkeypatch.setattr(mover.os, 'makedirs', lambda p, **kw: created.append(p) or makedirs(p, **kw))
+    isdir = os.path.isdir
+    checked = []
+    monkeypatch.setattr(mover.os.path, 'isdir', lambda p: checked.append(p) or isdir(p))
+    out = tmp_path / 'out'
+
+    m = mover.Mover(cfg_name, str(out), names, dryrun=False)
+    m.run()
+
+    dirs = [str(out / 'Foto' / '2021' / f'2021-12-{d}') for d in (19, 20)]
+    assert [p for p in created if p in dirs] == dirs  # makedirs also recurses to parents
+    assert [p for p in checked if p in dirs] == dirs
+    assert m.status()['copied'] == 6
+
+
+def test_cancel_finishes_started_transfers(tmp_path, cfg_name, fake_exiftool, monkeypatch):
+    srcs = [_file(tmp_path, f'2021-12-19_13-11-3{i}.jpg') for i in range(6)]
+    cfg_name.set('main', 'use_shutil', '1')
+    cfg_name.set('main', 'move_mode', '0')
+    cfg_name.set('main', 'copy_workers', '2')
+    cancel = threading.Event()
+    copy2 = mover.shutil.copy2
+
+    def copy_and_cancel(src, dst):
+        cancel.set()
+        time.sleep(0.05)
+        copy2(src, dst)
+
+    monkeypatch.setattr(mover.shutil, 'copy2', copy_and_cancel)
+    m = mover.Mover(cfg_name, str(tmp_path / 'out'), srcs, dryrun=False, cancel=cancel)
+    res = m.run()
+
+    assert 1 <= len(res) < 6
+    assert m.status()['copied'] == len(res)
+    assert m.status()['processed'] == len(res)
+    assert m.status()['errors'] == 0
+    for _, new, _ in res:
+        assert os.path.getsize(new) == 4
+
+
+class _FullJournal:
+    def done(self, path, size, mtime_ns):
+        return False
+
+    def add(self, *args):
+        raise OSError(28, 'No space left on device')
+
+
+def test_journal_error_counted(tmp_path, cfg_name, fake_exiftool):
+    cfg_name.set('main', 'use_shutil', '1')
+    srcs = [_file(tmp_path, f'2021-12-19_13-11-3{i}.jpg') for i in range(3)]
+    out = tmp_path / 'out'
+
+    m = mover.Mover(cfg_name, str(out), srcs, dryrun=False, journal=_FullJournal())
+    res = m.run()
+
+    assert len(res) == 3
+    assert m.status()['processed'] == 3
+    assert m.status()['errors'] == 3
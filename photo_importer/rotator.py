@@ -1,11 +1,22 @@
 #!/usr/bin/python3
+# pylint: disable=too-many-instance-attributes,too-many-arguments
 
 import os
+import shutil
+import struct
 import logging
 import tempfile
+import functools
+import threading
+import contextlib
 import subprocess
 import concurrent.futures
-import exiftool
+
+from photo_importer import log
+from photo_importer import exifpool
+from photo_importer import fileprop
+from photo_importer import exifreader
+from photo_importer import turbojpeg
 
 
 JPEGTRAN_COMMAND = {
@@ -20,41 +31,128 @@ JPEGTRAN_COMMAND = {
     8: '-rotate 270',
 }
 
-ORIENTATION_TAG = 'EXIF:Orientation'
+TURBOJPEG_OP = {
+    2: turbojpeg.TJXOP_HFLIP,
+    3: turbojpeg.TJXOP_ROT180,
+    4: turbojpeg.TJXOP_VFLIP,
+    5: turbojpeg.TJXOP_TRANSPOSE,
+    6: turbojpeg.TJXOP_ROT90,
+    7: turbojpeg.TJXOP_TRANSVERSE,
+    8: turbojpeg.TJXOP_ROT270,
+}
+
+ORIENTATION_TAG = fileprop.ORIENTATION_TAG
+
+NORMAL_ORIENTATIONS = (0, 1)
 
 
 class Rotator:
-    def __init__(self, config, filenames, dryrun):
+    def __init__(self, config, filenames, dryrun, orientations=None, exif_pool=None, executor=None, cancel=None, journal=None):
         self.__config = config
         self.__filenames = filenames
         self.__dryrun = dryrun
+        # Orientations already known from the move stage, by filename
+        self.__orientations = orientations if orientations is not None else {}
+        self.__total = len(filenames) if hasattr(filenames, '__len__') else 0
         self.__processed = 0
         self.__good = 0
         self.__errors = 0
+        self.__skipped = 0
+        # Exiftool pool and workers shared with other imports, not closed here
+        self.__shared_exiftool = exif_pool
+        self.__shared_executor = executor
+        # Set to stop before the next file, started rotations are finished
+        self.__cancel = cancel if cancel is not None else threading.Event()
+        # Rotated files are journaled, so a resumed import skips them
+        self.__journal = journal
         self.__exiftool = None
+        self.__turbojpeg = None
+        self.__lock = threading.Lock()
 
     def run(self):
         os.umask(int(self.__config['main']['umask'], 8))
         tc = int(self.__config['main']['threads_count'])
+        processor = self.__processor(tc)
+
+        if self.__shared_executor is not None:
+            pool = contextlib.nullcontext(self.__shared_executor)
+            # Shared workers run in the log context of the submitting import
+            processor = log.propagate(processor)
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=tc, **log.executor_args())
+
+        with pool as executor:
+            self.__rotate_all(executor, processor, tc * 2)
+
+        if self.__exiftool is not None and self.__exiftool is not self.__shared_exiftool:
+            self.__exiftool.close()
+
+    def __processor(self, tc):
         processor = self.__process_exiftran
         self.__exiftool = None
-        if int(self.__config['main']['use_jpegtran']):
-            self.__exiftool = exiftool.ExifToolHelper()
+        if int(self.__config['main']['use_turbojpeg']):
+            self.__turbojpeg = turbojpeg.load()
+            if self.__turbojpeg is None:
+                logging.warning('libturbojpeg not found, use external tools')
+            else:
+                processor = self.__process_turbojpeg
+        if self.__turbojpeg is None and int(self.__config['main']['use_jpegtran']):
+            # Every worker thread gets its own exiftool process from the pool
+            self.__exiftool = self.__shared_exiftool or exifpool.ExifToolPool(tc)
             processor = self.__process_jpegtran
-            tc = 1
+        return processor
+
+    def __rotate_all(self, executor, processor, max_pending):
+        # Filenames may be a stream, so limit the count of queued files.
+        # Slots are released by the done callbacks, not by a with block.
+        pending = threading.BoundedSemaphore(max_pending)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=tc) as executor:
-            futures = {executor.submit(processor, fn): fn for fn in self.__filenames}
+        def done(fn, future):
+            try:
+                self.__count(future.exception() is None and future.result() and self.__journal_rotated(fn))
+            finally:
+                pending.release()
+
+        cancelled = False
+        for i, fn in enumerate(self.__filenames, 1):
+            if self.__cancel.is_set():
+                if not cancelled:
+                    logging.info('Rotate cancelled')
+                    cancelled = True
+                # Input is still read to the end, so a producer writing
+                # to a bounded queue is not blocked
+                continue
+            self.__total = max(self.__total, i)
+            if self.__orientations.pop(fn, None) in NORMAL_ORIENTATIONS:
+                logging.debug('rotate: skip %s', fn)
+                self.__count(self.__journal_rotated(fn), skipped=True)
+                continue
+            pending.acquire()  # pylint: disable=consider-using-with
+            executor.submit(processor, fn).add_done_callback(functools.partial(done, fn))
 
-            for future in concurrent.futures.as_completed(futures):
-                self.__processed += 1
-                if future.result():
-                    self.__good += 1
-                else:
-                    self.__errors += 1
+        # Shared workers are not joined, wait for the queued files
+        for _ in range(max_pending):
+            pending.acquire()  # pylint: disable=consider-using-with
 
-        if self.__exiftool is not None:
-            self.__exiftool.terminate()
+    def __count(self, ok, skipped=False):
+        with self.__lock:
+            self.__processed += 1
+            if ok:
+                self.__good += 1
+                if skipped:
+                    self.__skipped += 1
+            else:
+                self.__errors += 1
+
+    def __journal_rotated(self, filename):
+        if self.__journal is None or self.__dryrun:
+            return True
+        try:
+            self.__journal.rotated(filename)
+        except OSError as ex:
+            logging.error('Journal (%s) error: %s', filename, ex)
+            return False
+        return True
 
     def __process_exiftran(self, filename):
         ok = False
@@ -137,8 +235,55 @@ class Rotator:
             logging.error('Rotator exception (%s): %s', filename, ex)
             return False
 
+    def __process_turbojpeg(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+
+            found = exifreader.find_orientation(data)
+            if found is None:
+                return True
+            pos, order = found
+            (orientation,) = struct.unpack_from(order + 'H', data, pos)
+            if orientation not in TURBOJPEG_OP:
+                return True
+
+            logging.debug('rotate: turbojpeg %s %s', orientation, filename)
+            if self.__dryrun:
+                return True
+
+            data = bytearray(self.__turbojpeg.transform(data, TURBOJPEG_OP[orientation]))
+            # Markers are copied unchanged, so only the tag value is reset
+            found = exifreader.find_orientation(data)
+            if found is None:
+                logging.error('turbojpeg (%s) dropped the exif data', filename)
+                return False
+            pos, order = found
+            struct.pack_into(order + 'H', data, pos, 1)
+
+            handle, tmpfile = tempfile.mkstemp(dir=os.path.dirname(filename))
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    f.write(data)
+                shutil.copystat(filename, tmpfile)
+                os.replace(tmpfile, filename)
+                tmpfile = None
+            finally:
+                if tmpfile is not None and os.path.exists(tmpfile):
+                    os.remove(tmpfile)
+
+            return True
+        except Exception as ex:
+            logging.error('Rotator exception (%s): %s', filename, ex)
+            return False
+
     def __get_orientation_cmd(self, fullname):
-        tags = self.__exiftool.get_tags(fullname, ORIENTATION_TAG)[0]
+        tags = None
+        if int(self.__config['main']['use_native_exif']):
+            tags = exifreader.read_tags(fullname)
+        if tags is None:
+            with self.__exiftool.helper() as et:
+                tags = et.get_tags(fullname, ORIENTATION_TAG)[0]
         if ORIENTATION_TAG not in tags:
             return None
         orientation = tags[ORIENTATION_TAG]
@@ -148,7 +293,8 @@ class Rotator:
         return None
 
     def __clear_orientation_tag(self, fullname):
-        self.__exiftool.set_tags(fullname, {ORIENTATION_TAG: 1})
+        with self.__exiftool.helper() as et:
+            et.set_tags(fullname, {ORIENTATION_TAG: 1})
         try:
             os.remove(fullname + '_original')
         except Exception:
@@ -156,8 +302,9 @@ class Rotator:
 
     def status(self):
         return {
-            'total': len(self.__filenames),
+            'total': self.__total,
             'processed': self.__processed,
             'good': self.__good,
             'errors': self.__errors,
+            'skipped': self.__skipped,
         }
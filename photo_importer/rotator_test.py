@@ -1,6 +1,13 @@
 #!/usr/bin/python3
 # pylint: disable=redefined-outer-name,unused-argument,too-few-public-methods
 
+import ctypes
+import ctypes.util
+import struct
+import pathlib
+import threading
+import concurrent.futures
+
 import pytest
 
 from photo_importer import rotator
@@ -106,13 +113,97 @@ def test_exiftran_dryrun_skips_subprocess(cfg, monkeypatch):
     assert r.status()['good'] == 1
 
 
+def test_normal_orientation_skipped(cfg, monkeypatch):
+    cfg.set('main', 'use_jpegtran', '0')
+    _FakePopen.stderr_lines = ['processing img.jpg\n']
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    orientations = {'/x/a.jpg': 1, '/x/b.jpg': 6}
+
+    r = rotator.Rotator(cfg, ['/x/a.jpg', '/x/b.jpg', '/x/c.jpg'], False, orientations)
+    r.run()
+
+    assert sorted(p.args[-1] for p in _FakePopen.instances) == ['/x/b.jpg', '/x/c.jpg']
+    assert r.status() == {'total': 3, 'processed': 3, 'good': 3, 'errors': 0, 'skipped': 1}
+    assert not orientations
+
+
+def test_shared_executor_waits_for_all(cfg, monkeypatch):
+    cfg.set('main', 'use_jpegtran', '0')
+    cfg.set('main', 'threads_count', '2')
+    _FakePopen.stderr_lines = ['processing img.jpg\n']
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    names = [f'/x/{i}.jpg' for i in range(10)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        r = rotator.Rotator(cfg, names, False, executor=executor)
+        r.run()
+        assert r.status()['processed'] == 10
+        assert r.status()['good'] == 10
+
+        # The shared executor is still usable by the next rotator
+        r = rotator.Rotator(cfg, names[:1], False, executor=executor)
+        r.run()
+        assert r.status()['good'] == 1
+
+
+def test_cancel_stops_before_next_file(cfg, monkeypatch):
+    cfg.set('main', 'use_jpegtran', '0')
+    cancel = threading.Event()
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+
+    def names():
+        yield '/x/a.jpg'
+        cancel.set()
+        yield '/x/b.jpg'
+
+    r = rotator.Rotator(cfg, names(), False, cancel=cancel)
+    r.run()
+
+    assert [p.args[-1] for p in _FakePopen.instances] == ['/x/a.jpg']
+    assert r.status()['processed'] == 1
+
+
+def test_cancel_reads_input_to_the_end(cfg, monkeypatch):
+    cfg.set('main', 'use_jpegtran', '0')
+    cancel = threading.Event()
+    cancel.set()
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    names = iter(['/x/a.jpg', '/x/b.jpg', '/x/c.jpg'])
+
+    rotator.Rotator(cfg, names, False, cancel=cancel).run()
+
+    assert not _FakePopen.instances
+    assert next(names, None) is None
+
+
+class _FullJournal:
+    def rotated(self, dst):
+        raise OSError(28, 'No space left on device')
+
+
+def test_journal_error_counted(cfg, monkeypatch):
+    cfg.set('main', 'use_jpegtran', '0')
+    cfg.set('main', 'threads_count', '1')
+    _FakePopen.stderr_lines = ['processing img.jpg\n']
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    names = ['/x/a.jpg', '/x/b.jpg', '/x/c.jpg']
+
+    r = rotator.Rotator(cfg, names, False, {'/x/a.jpg': 1}, journal=_FullJournal())
+    thread = threading.Thread(target=r.run, daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert r.status() == {'total': 3, 'processed': 3, 'good': 0, 'errors': 3, 'skipped': 0}
+
+
 # --- jpegtran path ---
 
 
 @pytest.fixture
 def jpeg_cfg(cfg, monkeypatch):
     cfg.set('main', 'use_jpegtran', '1')
-    monkeypatch.setattr(rotator.exiftool, 'ExifToolHelper', _FakeHelper)
+    monkeypatch.setattr(rotator.exifpool.exiftool, 'ExifToolHelper', _FakeHelper)
     monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
     return cfg
 
@@ -194,3 +285,163 @@ def test_jpegtran_failure_keeps_original(tmp_path, jpeg_cfg):
 
     assert r.status()['errors'] == 1
     assert img.exists()
+
+
+def test_jpegtran_native_orientation(tmp_path, jpeg_cfg):
+    jpeg_cfg.set('main', 'use_native_exif', '1')
+    img = tmp_path / 'img.jpg'
+    img.write_bytes((pathlib.Path(__file__).parent / 'test_data' / 'img_1.JPG').read_bytes())
+    _FakeHelper.orientation = 6  # must not be asked, native orientation is 1
+
+    r = rotator.Rotator(jpeg_cfg, [str(img)], dryrun=False)
+    r.run()
+
+    assert not _FakePopen.instances
+    assert r.status()['good'] == 1
+
+
+# --- turbojpeg path ---
+
+
+class _FakeTurboJpeg:
+    ops = []
+
+    def transform(self, data, op):
+        _FakeTurboJpeg.ops.append(op)
+        return data
+
+
+def _oriented_jpeg(tmp_path, orientation):
+    data = bytearray((pathlib.Path(__file__).parent / 'test_data' / 'img_1.JPG').read_bytes())
+    pos, order = rotator.exifreader.find_orientation(data)
+    struct.pack_into(order + 'H', data, pos, orientation)
+    img = tmp_path / 'img.jpg'
+    img.write_bytes(data)
+    return img
+
+
+@pytest.fixture
+def turbo_cfg(cfg, monkeypatch):
+    cfg.set('main', 'use_turbojpeg', '1')
+    _FakeTurboJpeg.ops = []
+    monkeypatch.setattr(rotator.turbojpeg, 'load', _FakeTurboJpeg)
+    monkeypatch.setattr(rotator.subprocess, 'Popen', _FakePopen)
+    return cfg
+
+
+def test_turbojpeg_rotates_and_resets_orientation(tmp_path, turbo_cfg):
+    img = _oriented_jpeg(tmp_path, 6)
+    img.chmod(0o644)
+
+    r = rotator.Rotator(turbo_cfg, [str(img)], dryrun=False)
+    r.run()
+
+    assert _FakeTurboJpeg.ops == [rotator.turbojpeg.TJXOP_ROT90]
+    assert rotator.exifreader.read_tags(str(img))['EXIF:Orientation'] == 1
+    assert img.stat().st_mode & 0o777 == 0o644
+    assert list(tmp_path.iterdir()) == [img]
+    assert not _FakePopen.instances
+    assert r.status()['good'] == 1
+
+
+def test_turbojpeg_lost_exif_keeps_original(tmp_path, turbo_cfg, monkeypatch):
+    img = _oriented_jpeg(tmp_path, 6)
+    data = img.read_bytes()
+    monkeypatch.setattr(_FakeTurboJpeg, 'transform', lambda self, data, op: b'\xff\xd8\xff\xd9')
+
+    r = rotator.Rotator(turbo_cfg, [str(img)], dryrun=False)
+    r.run()
+
+    assert r.status()['errors'] == 1
+    assert img.read_bytes() == data
+
+
+def test_turbojpeg_normal_orientation_untouched(tmp_path, turbo_cfg):
+    img = _oriented_jpeg(tmp_path, 1)
+
+    r = rotator.Rotator(turbo_cfg, [str(img)], dryrun=False)
+    r.run()
+
+    assert not _FakeTurboJpeg.ops
+    assert r.status()['good'] == 1
+
+
+def test_turbojpeg_dryrun(tmp_path, turbo_cfg):
+    img = _oriented_jpeg(tmp_path, 8)
+
+    rotator.Rotator(turbo_cfg, [str(img)], dryrun=True).run()
+
+    assert not _FakeTurboJpeg.ops
+    assert rotator.exifreader.read_tags(str(img))['EXIF:Orientation'] == 8
+
+
+def test_turbojpeg_missing_library_falls_back(tmp_path, turbo_cfg, monkeypatch):
+    monkeypatch.setattr(rotator.turbojpeg, 'load', lambda: None)
+    _FakePopen.stderr_lines = ['processing img.jpg\n']
+
+    r = rotator.Rotator(turbo_cfg, ['/x/img.jpg'], dryrun=False)
+    r.run()
+
+    assert _FakePopen.instances[0].args == ['exiftran', '-aip', '/x/img.jpg']
+    assert r.status()['good'] == 1
+
+
+def _decoded_size(data):
+    """(width, height) of data fully decoded by libturbojpeg."""
+    for name in rotator.turbojpeg.LIBRARY_NAMES:
+        path = ctypes.util.find_library(name)
+        if path is not None:
+            break
+    lib = ctypes.CDLL(path)
+    lib.tjInitDecompress.restype = ctypes.c_void_p
+    lib.tjDestroy.argtypes = [ctypes.c_void_p]
+    lib.tjDecompressHeader3.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_ulong] + [ctypes.POINTER(ctypes.c_int)] * 4
+    lib.tjDecompress2.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_ulong, ctypes.c_char_p] + [ctypes.c_int] * 5
+    handle = lib.tjInitDecompress()
+    try:
+        width, height, subsamp, colorspace = (ctypes.c_int() for _ in range(4))
+        assert not lib.tjDecompressHeader3(
+            handle, data, len(data), ctypes.byref(width), ctypes.byref(height), ctypes.byref(subsamp), ctypes.byref(colorspace)
+        )
+        pixels = ctypes.create_string_buffer(width.value * height.value * 3)
+        assert not lib.tjDecompress2(handle, data, len(data), pixels, width.value, 0, height.value, 0, 0)  # TJPF_RGB
+        return width.value, height.value
+    finally:
+        lib.tjDestroy(handle)
+
+
+def test_turbojpeg_real_library(tmp_path, cfg):
+    if rotator.turbojpeg.load() is None:
+        pytest.skip('libturbojpeg is not available')
+    cfg.set('main', 'use_turbojpeg', '1')
+    img = _oriented_jpeg(tmp_path, 6)
+    width, height = _decoded_size(img.read_bytes())
+
+    r = rotator.Rotator(cfg, [str(img)], dryrun=False)
+    r.run()
+
+    assert r.status()['good'] == 1
+    assert _decoded_size(img.read_bytes()) == (height, width)
+    assert rotator.exifreader.read_tags(str(img))['EXIF:Orientation'] == 1
+
+
+def test_jpegtran_uses_all_threads(tmp_path, jpeg_cfg, monkeypatch):
+    jpeg_cfg.set('main', 'threads_count', '3')
+    barrier = threading.Barrier(3, timeout=5)
+
+    class _ParallelHelper(_FakeHelper):
+        def get_tags(self, fullname, tag):
+            barrier.wait()  # breaks unless 3 files are processed at once
+            return super().get_tags(fullname, tag)
+
+    monkeypatch.setattr(rotator.exifpool.exiftool, 'ExifToolHelper', _ParallelHelper)
+    images = []
+    for i in range(3):
+        img = tmp_path / f'img{i}.jpg'
+        img.write_bytes(b'x')
+        images.append(str(img))
+
+    r = rotator.Rotator(jpeg_cfg, images, dryrun=False)
+    r.run()
+
+    assert r.status()['good'] == 3
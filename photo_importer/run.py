@@ -37,6 +37,13 @@ class ProgressBar(threading.Thread):
             ],
         ).start()
 
+    def __update_total(self, total):
+        # Streaming scan, the total grows while files are moved
+        if self.__pbar is None:
+            self.__create('Import:', total)
+        elif total > self.__pbar.maxval:
+            self.__pbar.maxval = total
+
     def run(self):
         stage = ''
         while True:
@@ -48,7 +55,11 @@ class ProgressBar(threading.Thread):
                     print('Scan... ', end='', flush=True)
                     continue
                 if stage == 'move':
-                    print(f'Done. Found {stat["total"]} files')
+                    if 'scan' in stat:
+                        # streaming scan, it is still in progress
+                        print()
+                    else:
+                        print(f'Done. Found {stat["total"]} files')
                     self.__create('Import:', stat['total'])
                     continue
                 if stage == 'rotate':
@@ -59,8 +70,17 @@ class ProgressBar(threading.Thread):
                         self.__pbar.finish()
                     break
 
-            if stage in ('move', 'rotate') and self.__pbar is not None:
-                self.__pbar.update(stat[stage]['processed'])
+            if stage not in ('move', 'rotate'):
+                continue
+
+            # One snapshot: the importer keeps counting while it is read
+            processed = stat[stage]['processed']
+
+            if stage == 'move' and 'scan' in stat:
+                self.__update_total(stat['total'])
+
+            if self.__pbar is not None:
+                self.__pbar.update(min(processed, self.__pbar.maxval))
 
 
 def args_parse():
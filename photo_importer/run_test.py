@@ -62,3 +62,15 @@ def test_main_on_empty_dir(tmp_path, monkeypatch, fake_exiftool):
     run.main()
 
     assert logfile.exists()
+
+
+def test_progressbar_processed_over_total(capsys):
+    # Streaming scan: processed is read after total has grown
+    statuses = [
+        {'stage': 'scan', 'total': 0, 'scan': {}},
+        {'stage': 'move', 'total': 1, 'scan': {}, 'move': {'processed': 0}},
+        {'stage': 'move', 'total': 1, 'scan': {}, 'move': {'processed': 3}},
+        {'stage': 'move', 'total': 4, 'scan': {}, 'move': {'processed': 4}},
+        {'stage': 'done'},
+    ]
+    run.ProgressBar(_FakeImporter(statuses)).run()
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+import os
+import collections
+
+# Stat info is taken once while scanning and reused by the later stages
+FileRecord = collections.namedtuple('FileRecord', ['path', 'size', 'mtime_ns', 'inode', 'dev'])
+
+
+def path_of(item):
+    """Path of a FileRecord or of a plain filename."""
+    return item.path if isinstance(item, FileRecord) else item
+
+
+def record_of(item):
+    """FileRecord, or None for a plain filename."""
+    return item if isinstance(item, FileRecord) else None
+
+
+def walk(top, onerror=None, sort=True):
+    """Yield (dirpath, subdir paths, file records) top-down.
+
+    Entries are sorted by name, unless sort is False. Like os.walk,
+    symlinks to dirs are listed but not followed.
+    """
+    try:
+        with os.scandir(top) as it:
+            entries = sorted(it, key=lambda e: e.name) if sort else list(it)
+    except OSError as ex:
+        if onerror is not None:
+            onerror(ex)
+        return
+
+    dirs = []
+    files = []
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                dirs.append(entry)
+                continue
+            st = entry.stat()
+        except OSError as ex:
+            if onerror is not None:
+                onerror(ex)
+            continue
+        files.append(FileRecord(entry.path, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev))
+
+    yield top, [d.path for d in dirs], files
+
+    for entry in dirs:
+        if not entry.is_symlink():
+            yield from walk(entry.path, onerror, sort)
+
+
+def scan(top, onerror=None, sort=True):
+    """Yield file records of the whole tree."""
+    for _, _, files in walk(top, onerror, sort):
+        yield from files
+
+
+def device(path):
+    """st_dev of the path, or of its nearest existing parent.
+
+    Output dirs may not exist yet, e.g. in dry run mode.
+    """
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def folder_size(top):
+    return sum(r.size for r in scan(top, sort=False))
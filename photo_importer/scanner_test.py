@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+
+import os
+
+from photo_importer import scanner
+
+
+def _tree(tmp_path):
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a' / 'c').mkdir(parents=True)
+    (tmp_path / 'z.jpg').write_bytes(b'12345')
+    (tmp_path / 'a' / 'y.jpg').write_bytes(b'1')
+    (tmp_path / 'a' / 'c' / 'x.mp4').write_bytes(b'123')
+
+
+def test_walk_is_sorted_top_down(tmp_path):
+    _tree(tmp_path)
+
+    res = [(root, dirs, [os.path.basename(f.path) for f in files]) for root, dirs, files in scanner.walk(str(tmp_path))]
+
+    assert res == [
+        (str(tmp_path), [str(tmp_path / 'a'), str(tmp_path / 'b')], ['z.jpg']),
+        (str(tmp_path / 'a'), [str(tmp_path / 'a' / 'c')], ['y.jpg']),
+        (str(tmp_path / 'a' / 'c'), [], ['x.mp4']),
+        (str(tmp_path / 'b'), [], []),
+    ]
+
+
+def test_records_hold_stat_info(tmp_path):
+    _tree(tmp_path)
+
+    for record in scanner.scan(str(tmp_path)):
+        st = os.stat(record.path)
+        assert record == (record.path, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+
+def test_dir_symlink_not_followed(tmp_path):
+    _tree(tmp_path)
+    os.symlink(tmp_path / 'a', tmp_path / 'link')
+
+    paths = [r.path for r in scanner.scan(str(tmp_path))]
+
+    assert len(paths) == 3
+
+
+def test_errors_reported(tmp_path):
+    errors = []
+    assert not list(scanner.scan(str(tmp_path / 'missing'), errors.append))
+    assert len(errors) == 1
+
+
+def test_folder_size(tmp_path):
+    _tree(tmp_path)
+    assert scanner.folder_size(str(tmp_path)) == 9
+
+
+def test_path_of():
+    record = scanner.FileRecord('/x/a.jpg', 1, 2, 3, 4)
+    assert scanner.path_of(record) == '/x/a.jpg'
+    assert scanner.path_of('/x/b.jpg') == '/x/b.jpg'
+    assert scanner.record_of(record) is record
+    assert scanner.record_of('/x/b.jpg') is None
+
+
+def test_unsorted_walk_finds_all(tmp_path):
+    _tree(tmp_path)
+    assert sorted(r.path for r in scanner.scan(str(tmp_path), sort=False)) == sorted(
+        r.path for r in scanner.scan(str(tmp_path))
+    )
+
+
+def test_device_of_missing_path(tmp_path):
+    assert scanner.device(str(tmp_path / 'no' / 'such')) == scanner.device(str(tmp_path))
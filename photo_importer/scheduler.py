@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+import logging
+import threading
+import concurrent.futures
+
+from photo_importer import scanner
+from photo_importer import exifpool
+from photo_importer import importer
+
+
+class SharedPools:
+    """Exiftool processes and rotate workers shared by all imports."""
+
+    def __init__(self, config):
+        threads_count = int(config['main']['threads_count'])
+        workers = int(config['main']['exif_workers'])
+        if workers == 0:
+            workers = threads_count
+        self.exiftool = exifpool.ExifToolPool(workers)
+        self.rotate_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads_count, thread_name_prefix='rotate'
+        )
+
+    def close(self):
+        self.rotate_executor.shutdown(wait=False)
+        self.exiftool.close()
+
+
+class ImportScheduler:
+    """Queue of imports, started while the concurrency limits allow.
+
+    max_imports caps running imports in total and max_per_device caps
+    imports writing to the same output device (0 is unlimited). Queued
+    imports are started in order, but one blocked by its device limit
+    does not hold the imports to other devices.
+    """
+
+    def __init__(self, config, max_imports, max_per_device, on_change=None):
+        self.__config = config
+        self.__max_imports = max_imports
+        self.__max_per_device = max_per_device
+        self.__on_change = on_change
+        self.__pools = SharedPools(config)
+        self.__lock = threading.Lock()
+        self.__queue = []  # (importer, device)
+        self.__running = {}  # importer: device
+
+    def submit(self, input_path, output_path, dryrun=False):
+        imp = importer.Importer(
+            self.__config,
+            input_path,
+            output_path,
+            dryrun,
+            pools=self.__pools,
+            on_done=self.__done,
+        )
+        with self.__lock:
+            self.__queue.append((imp, scanner.device(output_path)))
+            self.__start_ready()
+            queued = imp not in self.__running
+        if queued:
+            logging.info('import queued: %s', input_path)
+        return imp
+
+    def cancel(self, imp):
+        """Remove a queued import, running ones are not affected."""
+        with self.__lock:
+            self.__queue = [(i, dev) for i, dev in self.__queue if i is not imp]
+
+    def position(self, imp):
+        """1-based position of a queued import, 0 if it is not queued."""
+        with self.__lock:
+            for pos, (i, _) in enumerate(self.__queue, 1):
+                if i is imp:
+                    return pos
+        return 0
+
+    def close(self):
+        with self.__lock:
+            self.__queue = []
+        self.__pools.close()
+
+    def __done(self, imp):
+        with self.__lock:
+            self.__running.pop(imp, None)
+            self.__start_ready()
+        if self.__on_change is not None:
+            self.__on_change()
+
+    def __allowed(self, device, running_devices):
+        if self.__max_imports and len(self.__running) >= self.__max_imports:
+            return False
+        if self.__max_per_device and running_devices.count(device) >= self.__max_per_device:
+            return False
+        return True
+
+    def __start_ready(self):
+        # Called under the lock
+        started = []
+        queue = []
+        for imp, device in self.__queue:
+            if self.__allowed(device, list(self.__running.values())):
+                self.__running[imp] = device
+                started.append(imp)
+            else:
+                queue.append((imp, device))
+        self.__queue = queue
+        for imp in started:
+            imp.start()
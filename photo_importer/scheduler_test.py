@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# pylint: disable=redefined-outer-name,unused-argument,too-few-public-methods,too-many-arguments
+
+import threading
+
+import pytest
+
+from photo_importer import scheduler
+
+
+class _FakeImporter:
+    def __init__(self, config, input_path, output_path, dryrun, pools=None, on_done=None):
+        self.input_path = input_path
+        self.pools = pools
+        self.started = False
+        self.release = threading.Event()
+        self.__on_done = on_done
+
+    def start(self):
+        self.started = True
+        threading.Thread(target=self.__run).start()
+
+    def __run(self):
+        self.release.wait(5)
+        self.__on_done(self)
+
+
+@pytest.fixture
+def out_devices(monkeypatch):
+    devices = {}
+    monkeypatch.setattr(scheduler.scanner, 'device', lambda path: devices.get(path, 1))
+    return devices
+
+
+@pytest.fixture
+def sched(cfg, out_devices, monkeypatch):
+    monkeypatch.setattr(scheduler.importer, 'Importer', _FakeImporter)
+    s = scheduler.ImportScheduler(cfg, 2, 1)
+    yield s
+    s.close()
+
+
+def _wait_started(imp):
+    for _ in range(500):
+        if imp.started:
+            return True
+        threading.Event().wait(0.01)
+    return False
+
+
+def test_per_device_limit_and_order(sched, out_devices):
+    out_devices.update({'/o1': 1, '/o2': 2})
+    first = sched.submit('/a', '/o1')
+    second = sched.submit('/b', '/o1')
+    other = sched.submit('/c', '/o2')
+
+    assert first.started and other.started
+    assert not second.started
+    assert sched.position(second) == 1
+    assert sched.position(first) == 0
+    assert first.pools is second.pools
+
+    first.release.set()
+    assert _wait_started(second)
+    assert sched.position(second) == 0
+    other.release.set()
+    second.release.set()
+
+
+def test_global_limit(sched, out_devices):
+    out_devices.update({'/o1': 1, '/o2': 2, '/o3': 3})
+    imps = [sched.submit(f'/{i}', f'/o{i}') for i in (1, 2, 3)]
+
+    assert [imp.started for imp in imps] == [True, True, False]
+    assert sched.position(imps[2]) == 1
+
+    imps[1].release.set()
+    assert _wait_started(imps[2])
+    for imp in imps:
+        imp.release.set()
+
+
+def test_cancel_queued(sched):
+    first = sched.submit('/a', '/o')
+    queued = sched.submit('/b', '/o')
+    last = sched.submit('/c', '/o')
+    assert sched.position(last) == 2
+
+    sched.cancel(queued)
+    assert sched.position(queued) == 0
+    assert sched.position(last) == 1
+
+    first.release.set()
+    assert _wait_started(last)
+    assert not queued.started
+    last.release.set()
@@ -1,16 +1,17 @@
 #!/usr/bin/python3
-# pylint: disable=import-outside-toplevel,import-error,invalid-name,duplicate-code
+# pylint: disable=import-outside-toplevel,import-error,invalid-name,duplicate-code,too-many-instance-attributes,too-many-public-methods
 
 import os
-import re
-import glob
 import json
+import time
 import urllib
 import logging
 import argparse
 import threading
+import collections
 import subprocess
 import socketserver
+import concurrent.futures
 import http.server
 from http import HTTPStatus
 
@@ -18,10 +19,12 @@ import psutil
 
 from photo_importer import log
 from photo_importer import config
-from photo_importer import importer
+from photo_importer import scanner
+from photo_importer import devices
+from photo_importer import scheduler
 
 
-FIXED_IN_PATH_NAME = 'none'
+FIXED_IN_PATH_NAME = devices.FIXED_IN_PATH_NAME
 
 
 class HTTPError(Exception):
@@ -33,6 +36,216 @@ class HTTPError(Exception):
         return str(self.code) + ': ' + str(self.reason)
 
 
+class FolderSize:
+    """Folder tree sizes, cached for ttl seconds.
+
+    Outdated sizes are returned while they are recomputed in background,
+    and concurrent requests of the same path share one computation.
+    """
+
+    def __init__(self, ttl):
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        self.__sizes = {}  # path: (size, monotonic time)
+        self.__running = {}  # path: Future
+
+    def get(self, path):
+        with self.__lock:
+            cached = self.__sizes.get(path)
+            if cached is not None and time.monotonic() - cached[1] < self.__ttl:
+                return cached[0]
+            future = self.__running.get(path)
+            if future is None:
+                future = concurrent.futures.Future()
+                self.__running[path] = future
+                threading.Thread(target=self.__compute, args=(path, future), daemon=True).start()
+        if cached is not None:
+            return cached[0]
+        return future.result()
+
+    def invalidate(self):
+        with self.__lock:
+            self.__sizes = {path: (size, float('-inf')) for path, (size, _) in self.__sizes.items()}
+
+    def __compute(self, path, future):
+        try:
+            size = scanner.folder_size(path)
+        except Exception as ex:
+            logging.warning('folder size (%s) error: %s', path, ex)
+            with self.__lock:
+                del self.__running[path]
+            future.set_exception(ex)
+            return
+        with self.__lock:
+            self.__sizes[path] = (size, time.monotonic())
+            del self.__running[path]
+        future.set_result(size)
+
+
+def _bytes_to_gbytes(b):
+    return round(b / 1024.0 / 1024.0 / 1024.0, 2)
+
+
+class SysInfoSampler:
+    """CPU, memory and disk usage of path, sampled every interval seconds.
+
+    One thread samples for all clients, so cpu_percent is measured over
+    the same fixed period. The last history samples are kept for charts.
+    """
+
+    def __init__(self, path, interval, history):
+        self.__path = path
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__samples = collections.deque(maxlen=max(history, 1))
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def path(self):
+        return self.__path
+
+    def start(self):
+        psutil.cpu_percent()  # the first call has nothing to compare with
+        self.__sample()
+        self.__thread = threading.Thread(target=self.__run, name='sysinfo', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def latest(self):
+        with self.__lock:
+            return dict(self.__samples[-1])
+
+    def history(self, count):
+        with self.__lock:
+            samples = list(self.__samples)
+        return samples[-count:] if count > 0 else []
+
+    def __run(self):
+        while not self.__stop.wait(self.__interval):
+            self.__sample()
+
+    def __sample(self):
+        res = {'time': round(time.time(), 3)}
+        try:
+            du = psutil.disk_usage(self.__path)
+            res['disk_size'] = _bytes_to_gbytes(du.total)
+            res['disk_usage'] = du.percent
+        except OSError as ex:
+            logging.debug('sysinfo disk usage (%s) error: %s', self.__path, ex)
+        mem = psutil.virtual_memory()
+        res['cpu'] = psutil.cpu_percent()
+        res['mem_total'] = _bytes_to_gbytes(mem.total)
+        res['mem_usage'] = mem.percent
+        with self.__lock:
+            self.__samples.append(res)
+
+
+class EventsProducer:
+    """Mount list and sysinfo snapshots, computed once for all events clients.
+
+    The thread makes a new snapshot on state changes, every events_interval
+    while importing and every devices_interval otherwise. Sysinfo is taken
+    for every path subscribed by clients, and clients only wait for a new
+    snapshot version.
+    """
+
+    def __init__(self, server):
+        self.__server = server
+        self.__cond = threading.Condition()
+        self.__paths = collections.Counter()
+        self.__version = 0
+        self.__mounts = {}
+        self.__sysinfo = {}  # path: sysinfo, None if it is not available
+        self.__stopping = False
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, name='events', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        with self.__cond:
+            self.__stopping = True
+            self.__cond.notify_all()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def subscribe(self, path):
+        with self.__cond:
+            self.__paths[path] += 1
+            self.__cond.notify_all()
+            known = path in self.__sysinfo
+        if not known:
+            # Wakes the producer up, so sysinfo of the path is taken at once
+            self.__server.notify_changed()
+
+    def unsubscribe(self, path):
+        with self.__cond:
+            self.__paths[path] -= 1
+            if self.__paths[path] <= 0:
+                del self.__paths[path]
+
+    def wait(self, path, version, timeout):
+        """(version, mounts, sysinfo) of a snapshot newer than version.
+
+        The same version is returned on timeout.
+        """
+        with self.__cond:
+            self.__cond.wait_for(
+                lambda: self.__stopping or (self.__version != version and path in self.__sysinfo),
+                timeout,
+            )
+            if self.__version == version or path not in self.__sysinfo:
+                return version, self.__mounts, None
+            return self.__version, self.__mounts, self.__sysinfo[path]
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__stopping or self.__paths)
+                if self.__stopping:
+                    return
+                paths = list(self.__paths)
+
+            # Changes made from here on are not in this snapshot
+            changes = self.__server.changes_version()
+            # Taken before the state, so the end of an import is not missed
+            active = self.__server.import_active()
+            try:
+                mounts = self.__server.mount_list()
+            except Exception:
+                logging.exception('events mount list failed')
+                mounts = self.__mounts
+            sysinfo = {path: self.__system_info(path) for path in paths}
+            with self.__cond:
+                self.__version += 1
+                self.__mounts = mounts
+                self.__sysinfo = sysinfo
+                self.__cond.notify_all()
+
+            if active:
+                timeout = self.__server.events_interval()
+            else:
+                timeout = self.__server.devices_interval()
+            self.__server.wait_changed(changes, timeout)
+
+    def __system_info(self, path):
+        try:
+            res = self.__server.system_info(path)
+        except OSError as ex:
+            logging.debug('events sysinfo (%s) error: %s', path, ex)
+            return None
+        res['cpu'] = round(res['cpu'])
+        return res
+
+
 class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
     def __ok_response(self, result):
         self.send_response(200)
@@ -40,9 +253,11 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(bytearray(json.dumps(result), 'utf-8'))
 
-    def __text_response(self, result):
+    def __text_response(self, result, headers=None):
         self.send_response(200)
         self.send_header('Content-type', 'text/plain')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(bytearray(result, 'utf-8'))
 
@@ -55,128 +270,10 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(bytearray(explain, 'utf-8'))
 
-    def __get_mounted_list(self):
-        return {os.path.basename(dp.device): (dp.device, dp.mountpoint) for dp in psutil.disk_partitions()}
-
-    def __bytes_to_gbytes(self, b):
-        return round(b / 1024.0 / 1024.0 / 1024.0, 2)
-
-    def __get_removable_devices_posix(self):
-        mount_list = self.__get_mounted_list()
-        res = {}
-        for path in glob.glob('/sys/block/*/device'):
-            dev = re.sub(r'.*/(.*?)/device', r'\g<1>', path)
-            with open(f'/sys/block/{dev}/removable', encoding='utf-8') as f:
-                if f.read(1) != '1':
-                    continue
-            read_only = False
-            with open(f'/sys/block/{dev}/ro', encoding='utf-8') as f:
-                if f.read(1) == '1':
-                    read_only = True
-            for ppath in glob.glob(f'/sys/block/{dev}/{dev}*'):
-                pdev = os.path.split(ppath)[1]
-                if pdev in mount_list:
-                    res[pdev] = {
-                        'dev_path': mount_list[pdev][0],
-                        'mount_path': mount_list[pdev][1],
-                        'read_only': read_only,
-                    }
-                else:
-                    res[pdev] = {
-                        'dev_path': '/dev/' + pdev,
-                        'mount_path': '',
-                        'read_only': read_only,
-                    }
-
-        return res
-
-    def __get_removable_devices_win(self):  # pragma: no cover
-        import win32api
-        import win32con
-        import win32file
-
-        res = {}
-        for d in win32api.GetLogicalDriveStrings().split('\x00'):
-            if d and win32file.GetDriveType(d) == win32con.DRIVE_REMOVABLE:
-                dev_name = FIXED_IN_PATH_NAME + d
-                res[dev_name] = {
-                    'dev_path': dev_name,
-                    'mount_path': d,
-                    'read_only': not os.access(d, os.W_OK),
-                }
-        return res
-
-    def __get_removable_devices(self):
-        res = {}
-        if os.name == 'nt':
-            res = self.__get_removable_devices_win()
-        elif os.name == 'posix':
-            res = self.__get_removable_devices_posix()
-        else:
-            raise UserWarning(f'Unsupported os: {os.name}')
-
-        if self.server.fixed_in_path() != '':
-            res[FIXED_IN_PATH_NAME] = {
-                'dev_path': FIXED_IN_PATH_NAME,
-                'mount_path': self.server.fixed_in_path(),
-                'read_only': not os.access(self.server.fixed_in_path(), os.W_OK),
-            }
-
-        return res
-
-    def __folder_size(self, path):
-        res = 0
-        for entry in os.scandir(path):
-            if entry.is_file():
-                res += entry.stat().st_size
-            elif entry.is_dir():
-                res += self.__folder_size(entry.path)
-        return res
-
-    def __mount_get_list(self):
-        dev_list = self.__get_removable_devices()
-
-        res = {}
-        for dev, info in dev_list.items():
-            r = {}
-            r['path'] = info['mount_path']
-            r['progress'] = 0
-            r['read_only'] = info['read_only']
-            r['allow_start'] = not (info['read_only'] and self.server.move_mode())
-            if r['path']:
-                stat = self.server.import_status(r['path'])
-                du = psutil.disk_usage(r['path'])
-                if dev == FIXED_IN_PATH_NAME:
-                    r['size'] = self.__bytes_to_gbytes(self.__folder_size(r['path']))
-                else:
-                    r['size'] = self.__bytes_to_gbytes(du.total)
-                r['usage'] = du.percent
-                if stat:
-                    stage = stat['stage']
-                    r['state'] = stage
-                    if stage in ('move', 'rotate'):
-                        r['progress'] = round(100.0 * stat[stage]['processed'] / stat['total'])
-                    elif stage == 'done':
-                        cerr = stat['move']['errors'] + stat['rotate']['errors']
-                        if cerr != 0:
-                            r['state'] = 'error'
-                            r['total'] = cerr
-                            r['details'] = str(stat)
-                        else:
-                            r['total'] = stat['total']
-                else:
-                    r['state'] = 'mounted'
-            else:
-                r['size'] = 0
-                r['usage'] = 0
-                r['state'] = 'unmounted'
-            res[dev] = r
-        return res
-
     def __check_dev_for_mount(self, dev):
         if dev == '':
             raise HTTPError(HTTPStatus.BAD_REQUEST, 'empty "d" param')
-        dev_list = self.__get_removable_devices()
+        dev_list = self.server.removable_devices()
         if dev not in dev_list:
             raise HTTPError(HTTPStatus.BAD_REQUEST, f'wrong device: {dev}')
         device = dev_list[dev]
@@ -234,11 +331,13 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
         result = None
 
         if action == 'list':
-            result = self.__mount_get_list()
+            result = self.server.mount_list()
         elif action == 'mount':
             result = self.__mount_mount(dev)
+            self.server.refresh_devices()
         elif action == 'umount':
             result = self.__mount_umount(dev)
+            self.server.refresh_devices()
         else:
             raise HTTPError(HTTPStatus.BAD_REQUEST, f'unknown action {action}')
 
@@ -248,12 +347,11 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
         self.server.import_start(in_path, out_path)
         return True
 
-    def __import_stop(self, dev):
-        logging.warning('import stop not implemented: %s', dev)
-        return False
+    def __import_stop(self, in_path):
+        return self.server.import_stop(in_path)
 
-    def __import_get_log(self, in_path):
-        return self.server.get_log(in_path)
+    def __import_get_log(self, in_path, cursor):
+        return self.server.get_log(in_path, cursor)
 
     def __import_done(self, in_path):
         return self.server.import_done(in_path)
@@ -280,8 +378,13 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
             result = self.__import_stop(in_path)
             self.__ok_response(result)
         elif action == 'getlog':
-            result = self.__import_get_log(in_path)
-            self.__text_response(result)
+            # Clients pass the returned cursor back to get only new lines
+            try:
+                cursor = int(params.get('c', ['0'])[0])
+            except ValueError as ex:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(ex)) from ex
+            result, cursor = self.__import_get_log(in_path, cursor)
+            self.__text_response(result, {'X-Log-Cursor': str(cursor)})
         elif action == 'done':
             result = self.__import_done(in_path)
             self.__ok_response(result)
@@ -293,16 +396,65 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
             path = params['p'][0]
         except Exception:
             path = self.server.out_path()
-        res = {}
-        du = psutil.disk_usage(path)
-        mem = psutil.virtual_memory()
-        res['disk_size'] = self.__bytes_to_gbytes(du.total)
-        res['disk_usage'] = du.percent
-        res['cpu'] = psutil.cpu_percent()
-        res['mem_total'] = self.__bytes_to_gbytes(mem.total)
-        res['mem_usage'] = mem.percent
+        try:
+            history = int(params.get('h', ['0'])[0])
+        except ValueError as ex:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(ex)) from ex
+        res = self.server.system_info(path)
+        if history > 0:
+            # Disk usage in history is of the output path
+            res['history'] = self.server.sysinfo().history(history)
         self.__ok_response(res)
 
+    def __send_event(self, event, data):
+        self.wfile.write(bytearray(f'event: {event}\ndata: {json.dumps(data)}\n\n', 'utf-8'))
+        self.wfile.flush()
+
+    def __events_request(self, params):
+        try:
+            path = params['p'][0]
+        except Exception:
+            path = self.server.out_path()
+
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        # Snapshots are computed by the shared events producer, the stream
+        # only waits for a new one. Only changed devices are sent, removed
+        # ones are listed by name.
+        events = self.server.events()
+        events.subscribe(path)
+        version = 0
+        mounts = {}
+        sysinfo = None
+        try:
+            while not self.server.stopping():
+                new_version, new_mounts, new_sysinfo = events.wait(path, version, self.server.devices_interval())
+                sent = False
+                if new_version != version:
+                    version = new_version
+                    changed = {dev: r for dev, r in new_mounts.items() if mounts.get(dev) != r}
+                    removed = [dev for dev in mounts if dev not in new_mounts]
+                    if changed or removed:
+                        self.__send_event('mount', {'changed': changed, 'removed': removed})
+                        sent = True
+                    mounts = new_mounts
+
+                    if new_sysinfo is not None and new_sysinfo != sysinfo:
+                        self.__send_event('sysinfo', new_sysinfo)
+                        sent = True
+                        sysinfo = new_sysinfo
+
+                if not sent:  # detects closed connections
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logging.debug('events client disconnected')
+        finally:
+            events.unsubscribe(path)
+
     def __file_request(self, path):
         try:
             if (path[0]) == '/':
@@ -353,6 +505,10 @@ class PhotoImporterHandler(http.server.BaseHTTPRequestHandler):
                 self.__sysinfo_request(params)
                 return
 
+            if path == '/events':
+                self.__events_request(params)
+                return
+
             if path == '/':
                 path = 'index.html'
 
@@ -395,7 +551,6 @@ class PhotoImporterServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
     daemon_threads = True
 
     def __init__(self, cfg):
-        self.__cfg = cfg
         self.__importers = {}
         self.__importers_lock = threading.Lock()
         host = cfg['server']['host']
@@ -404,7 +559,31 @@ class PhotoImporterServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
         self.__out_path = cfg['server']['out_path']
         self.__fixed_in_path = cfg['server']['in_path']
         self.__move_mode = int(cfg['main']['move_mode'])
+        self.__events_interval = float(cfg['server']['events_interval'])
+        self.__devices_interval = float(cfg['server']['devices_interval'])
+        self.__folder_size = FolderSize(float(cfg['server']['folder_size_ttl']))
+        self.__auto_import = int(cfg['server']['auto_import'])
+        self.__devices = devices.DeviceMonitor(self.__devices_interval, self.__devices_changed)
+        self.__scheduler = scheduler.ImportScheduler(
+            cfg,
+            int(cfg['server']['max_imports']),
+            int(cfg['server']['max_imports_per_device']),
+            self.__import_finished,
+        )
+        self.__sysinfo = SysInfoSampler(
+            self.__out_path,
+            float(cfg['server']['sysinfo_interval']),
+            int(cfg['server']['sysinfo_history']),
+        )
+        # Version of the state changed by requests, events wait for it
+        self.__changes = threading.Condition()
+        self.__changes_version = 0
+        self.__stopping = False
         super().__init__((host, port), PhotoImporterHandler)
+        self.__devices.start()
+        self.__sysinfo.start()
+        self.__events = EventsProducer(self)
+        self.__events.start()
 
     def web_path(self):
         return self.__web_path
@@ -418,37 +597,207 @@ class PhotoImporterServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
     def move_mode(self):
         return self.__move_mode
 
+    def folder_size(self, path):
+        return self.__folder_size.get(path)
+
+    def devices(self):
+        return self.__devices.devices()
+
+    def sysinfo(self):
+        return self.__sysinfo
+
+    def events(self):
+        return self.__events
+
+    def refresh_devices(self):
+        self.__devices.refresh()
+
+    def __devices_changed(self, old, new):
+        self.notify_changed()
+        if not self.__auto_import:
+            return
+        for dev, info in new.items():
+            mount_path = info['mount_path']
+            if not mount_path or old.get(dev, {}).get('mount_path') == mount_path:
+                continue
+            if info['read_only'] and self.__move_mode:
+                logging.warning('auto import skipped, read only: %s', mount_path)
+                continue
+            if self.import_status(mount_path) is not None:
+                continue
+            logging.info('auto import: %s', mount_path)
+            self.import_start(mount_path, self.__out_path)
+
+    def events_interval(self):
+        return self.__events_interval
+
+    def devices_interval(self):
+        return self.__devices_interval
+
+    def changes_version(self):
+        with self.__changes:
+            return self.__changes_version
+
+    def notify_changed(self):
+        with self.__changes:
+            self.__changes_version += 1
+            self.__changes.notify_all()
+
+    def wait_changed(self, version, timeout):
+        with self.__changes:
+            self.__changes.wait_for(lambda: self.__changes_version != version or self.__stopping, timeout)
+            return self.__changes_version
+
+    def stopping(self):
+        return self.__stopping
+
+    def server_close(self):
+        with self.__changes:
+            self.__stopping = True
+            self.__changes.notify_all()
+        self.__events.stop()
+        self.__devices.stop()
+        self.__sysinfo.stop()
+        self.__scheduler.close()
+        super().server_close()
+
+    def removable_devices(self):
+        res = self.devices()
+
+        if self.__fixed_in_path != '':
+            res[FIXED_IN_PATH_NAME] = {
+                'dev_path': FIXED_IN_PATH_NAME,
+                'mount_path': self.__fixed_in_path,
+                'read_only': not os.access(self.__fixed_in_path, os.W_OK),
+            }
+
+        return res
+
+    def mount_list(self):
+        dev_list = self.removable_devices()
+
+        res = {}
+        for dev, info in dev_list.items():
+            r = {}
+            r['path'] = info['mount_path']
+            r['progress'] = 0
+            r['read_only'] = info['read_only']
+            r['allow_start'] = not (info['read_only'] and self.__move_mode)
+            if r['path']:
+                stat = self.import_status(r['path'])
+                du = psutil.disk_usage(r['path'])
+                if dev == FIXED_IN_PATH_NAME:
+                    r['size'] = _bytes_to_gbytes(self.folder_size(r['path']))
+                else:
+                    r['size'] = _bytes_to_gbytes(du.total)
+                r['usage'] = du.percent
+                if stat:
+                    self.__set_import_state(r, stat)
+                else:
+                    r['state'] = 'mounted'
+            else:
+                r['size'] = 0
+                r['usage'] = 0
+                r['state'] = 'unmounted'
+            res[dev] = r
+        return res
+
+    @staticmethod
+    def __set_import_state(r, stat):
+        stage = stat['stage']
+        r['state'] = stage
+        if stage == 'queued':
+            r['queue_position'] = stat['queue_position']
+        elif stage == 'cancelled':
+            # Files moved before the cancel
+            r['total'] = stat.get('move', {}).get('processed', 0)
+        elif stage in ('move', 'rotate') and stat['total']:
+            r['progress'] = round(100.0 * stat[stage]['processed'] / stat['total'])
+        elif stage == 'done':
+            cerr = stat['move']['errors'] + stat['rotate']['errors']
+            if cerr != 0:
+                r['state'] = 'error'
+                r['total'] = cerr
+                r['details'] = str(stat)
+            else:
+                r['total'] = stat['total']
+
+    def system_info(self, path):
+        sampler = self.__sysinfo
+        res = sampler.latest()
+        del res['time']
+        if path != sampler.path() or 'disk_size' not in res:
+            du = psutil.disk_usage(path)
+            res['disk_size'] = _bytes_to_gbytes(du.total)
+            res['disk_usage'] = du.percent
+        return res
+
+    def import_active(self):
+        with self.__importers_lock:
+            importers = list(self.__importers.values())
+        return any(self.__import_stat(imp)['stage'] not in ('done', 'cancelled') for imp in importers)
+
     def import_start(self, in_path, out_path):
         in_path = os.path.realpath(in_path)
         logging.info('import_start: %s', in_path)
 
-        imp = importer.Importer(self.__cfg, in_path, out_path, False)
         with self.__importers_lock:
-            self.__importers[in_path] = imp
-        imp.start()
+            old = self.__importers.get(in_path)
+            if old is not None:
+                self.__scheduler.cancel(old)
+            self.__importers[in_path] = self.__scheduler.submit(in_path, out_path)
+        self.notify_changed()
+
+    def __import_stat(self, imp):
+        position = self.__scheduler.position(imp)
+        if position:
+            return {'stage': 'queued', 'queue_position': position}
+        return imp.status()
+
+    def import_stop(self, in_path):
+        in_path = os.path.realpath(in_path)
+        logging.info('import_stop: %s', in_path)
+        with self.__importers_lock:
+            imp = self.__importers.get(in_path)
+        if imp is None:
+            return False
+        self.__scheduler.cancel(imp)
+        imp.cancel()
+        self.notify_changed()
+        return True
 
     def import_status(self, in_path):
         in_path = os.path.realpath(in_path)
         with self.__importers_lock:
             imp = self.__importers.get(in_path)
         if imp is not None:
-            return imp.status()
+            return self.__import_stat(imp)
         return None
 
+    def __import_finished(self):
+        # Files are moved out of the input path
+        self.__folder_size.invalidate()
+        self.notify_changed()
+
     def import_done(self, in_path):
         in_path = os.path.realpath(in_path)
         logging.info('import_done: %s', in_path)
         with self.__importers_lock:
-            self.__importers.pop(in_path, None)
+            imp = self.__importers.pop(in_path, None)
+            if imp is not None:
+                self.__scheduler.cancel(imp)
+        # Files are moved out of the input path
+        self.__folder_size.invalidate()
+        self.notify_changed()
         return ''
 
-    def get_log(self, in_path):
+    def get_log(self, in_path, cursor=0):
         in_path = os.path.realpath(in_path)
         with self.__importers_lock:
             imp = self.__importers.get(in_path)
         if imp is not None:
-            return imp.log_text()
-        return ''
+            return imp.log_text(cursor)
+        return '', 0
 
 
 def args_parse():
@@ -3,6 +3,8 @@
 
 import sys
 import json
+import time
+import logging
 import http.client
 import threading
 
@@ -44,7 +46,7 @@ class _ErrPopen:
         return False
 
 
-_DEVICES_ATTR = '_PhotoImporterHandler__get_removable_devices'
+_DEVICES_ATTR = 'removable_devices'
 
 
 @pytest.fixture
@@ -57,6 +59,7 @@ def http_server(tmp_path, cfg, fake_exiftool, monkeypatch):
     cfg.set('server', 'host', '127.0.0.1')
     cfg.set('server', 'port', '0')
     monkeypatch.setattr(server.PhotoImporterHandler, 'log_message', lambda *a, **k: None)
+    monkeypatch.setattr(server.devices, 'probe', lambda: {})
 
     srv = server.PhotoImporterServer(cfg)
     thread = threading.Thread(target=srv.serve_forever, daemon=True)
@@ -119,10 +122,42 @@ def test_sysinfo(http_server, tmp_path):
     assert status == 200
     data = json.loads(body)
     assert {'disk_size', 'disk_usage', 'cpu', 'mem_total', 'mem_usage'} <= set(data)
+    assert 'history' not in data
+
+
+def test_sysinfo_history(http_server, tmp_path):
+    status, _, body = _request(http_server, 'GET', '/sysinfo?h=5&p=' + str(tmp_path))
+    assert status == 200
+    history = json.loads(body)['history']
+    assert 1 <= len(history) <= 5
+    assert {'time', 'cpu', 'mem_usage'} <= set(history[-1])
+
+    status, _, _ = _request(http_server, 'GET', '/sysinfo?h=x')
+    assert status == 400
+
+
+def test_sysinfo_sampler_ring(tmp_path, monkeypatch):
+    cpu = iter(range(100))
+    monkeypatch.setattr(server.psutil, 'cpu_percent', lambda: next(cpu))
+    sampler = server.SysInfoSampler(str(tmp_path), 0.01, 3)
+    sampler.start()
+    try:
+        for _ in range(500):
+            if sampler.latest()['cpu'] >= 5:
+                break
+            time.sleep(0.01)
+    finally:
+        sampler.stop()
+
+    history = sampler.history(10)
+    assert len(history) == 3
+    assert [h['cpu'] for h in history] == list(range(history[0]['cpu'], history[0]['cpu'] + 3))
+    assert sampler.history(1) == history[-1:]
+    assert 'disk_size' in sampler.latest()
 
 
 def test_mount_list_empty(http_server, monkeypatch):
-    monkeypatch.setattr(server.PhotoImporterHandler, _DEVICES_ATTR, lambda self: {})
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: {})
     status, _, body = _request(http_server, 'GET', '/mount?a=list')
     assert status == 200
     assert json.loads(body) == {}
@@ -136,7 +171,7 @@ def test_mount_unknown_action_400(http_server):
 def test_mount_mount_uses_argv_list(http_server, monkeypatch):
     _RecPopen.calls = []
     monkeypatch.setattr(
-        server.PhotoImporterHandler,
+        server.PhotoImporterServer,
         _DEVICES_ATTR,
         lambda self: {'sdz1': {'dev_path': '/dev/sdz1', 'mount_path': '', 'read_only': False}},
     )
@@ -149,7 +184,7 @@ def test_mount_mount_uses_argv_list(http_server, monkeypatch):
 
 
 def test_mount_unknown_device_400(http_server, monkeypatch):
-    monkeypatch.setattr(server.PhotoImporterHandler, _DEVICES_ATTR, lambda self: {})
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: {})
     status, _, _ = _request(http_server, 'POST', '/mount?a=mount&d=sdz1')
     assert status == 400
 
@@ -166,7 +201,7 @@ def test_mount_list_with_devices(http_server, tmp_path, monkeypatch):
             'read_only': False,
         },
     }
-    monkeypatch.setattr(server.PhotoImporterHandler, _DEVICES_ATTR, lambda self: devices)
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: devices)
 
     status, _, body = _request(http_server, 'GET', '/mount?a=list')
 
@@ -178,7 +213,7 @@ def test_mount_list_with_devices(http_server, tmp_path, monkeypatch):
 
 def test_mount_cmd_error_500(http_server, monkeypatch):
     monkeypatch.setattr(
-        server.PhotoImporterHandler,
+        server.PhotoImporterServer,
         _DEVICES_ATTR,
         lambda self: {'sdz1': {'dev_path': '/dev/sdz1', 'mount_path': '', 'read_only': False}},
     )
@@ -209,6 +244,28 @@ def test_import_getlog_over_http(http_server, tmp_path):
     assert ctype == 'text/plain'
 
 
+def test_import_getlog_cursor_header(http_server, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    indir = tmp_path / 'imp_log_cursor'
+    indir.mkdir()
+    _request(http_server, 'POST', f'/import?a=start&p={indir}&o={tmp_path / "o"}')
+    conn = http.client.HTTPConnection('127.0.0.1', http_server)
+    try:
+        conn.request('GET', f'/import?a=getlog&p={indir}&c=0')
+        resp = conn.getresponse()
+        body = resp.read()
+        cursor = int(resp.getheader('X-Log-Cursor'))
+    finally:
+        conn.close()
+    assert resp.status == 200
+    assert cursor >= body.count(b'\n') > 0
+
+
+def test_import_getlog_bad_cursor(http_server, tmp_path):
+    status, _, _ = _request(http_server, 'GET', f'/import?a=getlog&p={tmp_path}&c=x')
+    assert status == 400
+
+
 def test_import_done_over_http(http_server, tmp_path):
     indir = tmp_path / 'imp_done'
     indir.mkdir()
@@ -217,12 +274,31 @@ def test_import_done_over_http(http_server, tmp_path):
     assert status == 200
 
 
-def test_import_stop_not_implemented(http_server):
+def test_import_stop_unknown_path(http_server):
     status, _, body = _request(http_server, 'GET', '/import?a=stop&p=/x')
     assert status == 200
     assert json.loads(body) is False
 
 
+def test_import_stop_queued(http_server, tmp_path, monkeypatch):
+    mnt = tmp_path / 'card'
+    mnt.mkdir()
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: _device(mnt))
+    # Imports are kept queued by the per-device limit
+    monkeypatch.setattr(server.scheduler.importer.Importer, 'start', lambda self: None)
+
+    _request(http_server, 'POST', f'/import?a=start&p={tmp_path}&o={tmp_path / "o"}')
+
+    _request(http_server, 'POST', f'/import?a=start&p={mnt}&o={tmp_path / "o"}')
+    status, _, body = _request(http_server, 'POST', f'/import?a=stop&p={mnt}')
+    assert status == 200
+    assert json.loads(body) is True
+
+    data = json.loads(_request(http_server, 'GET', '/mount?a=list')[2])['sdz1']
+    assert data['state'] == 'cancelled'
+    assert data['total'] == 0
+
+
 def test_import_missing_param_400(http_server):
     status, _, _ = _request(http_server, 'GET', '/import?a=start')
     assert status == 400
@@ -243,7 +319,7 @@ def _device(mnt):
 def test_mount_list_import_progress(http_server, tmp_path, monkeypatch):
     mnt = tmp_path / 'm'
     mnt.mkdir()
-    monkeypatch.setattr(server.PhotoImporterHandler, _DEVICES_ATTR, lambda self: _device(mnt))
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: _device(mnt))
     monkeypatch.setattr(
         server.PhotoImporterServer,
         'import_status',
@@ -261,7 +337,7 @@ def test_mount_list_import_progress(http_server, tmp_path, monkeypatch):
 def test_mount_list_import_done_with_errors(http_server, tmp_path, monkeypatch):
     mnt = tmp_path / 'm2'
     mnt.mkdir()
-    monkeypatch.setattr(server.PhotoImporterHandler, _DEVICES_ATTR, lambda self: _device(mnt))
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: _device(mnt))
     monkeypatch.setattr(
         server.PhotoImporterServer,
         'import_status',
@@ -282,7 +358,7 @@ def test_mount_list_import_done_with_errors(http_server, tmp_path, monkeypatch):
 def test_mount_list_import_done_ok(http_server, tmp_path, monkeypatch):
     mnt = tmp_path / 'm3'
     mnt.mkdir()
-    monkeypatch.setattr(server.PhotoImporterHandler, _DEVICES_ATTR, lambda self: _device(mnt))
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: _device(mnt))
     monkeypatch.setattr(
         server.PhotoImporterServer,
         'import_status',
@@ -337,8 +413,265 @@ def test_import_lifecycle(tmp_path, cfg, fake_exiftool):
         assert srv.import_status(str(indir)) is None
         srv.import_start(str(indir), str(tmp_path / 'out'))
         assert srv.import_status(str(indir)) is not None
-        assert srv.get_log(str(indir)) != ''
+        assert srv.get_log(str(indir))[0] != ''
         assert srv.import_done(str(indir)) == ''
         assert srv.import_status(str(indir)) is None
     finally:
         srv.server_close()
+
+
+# --- events stream ---
+
+
+def _read_event(resp):
+    event = None
+    while True:
+        line = resp.fp.readline().decode('utf-8').rstrip('\n')
+        if line.startswith('event: '):
+            event = line[7:]
+        elif line.startswith('data: '):
+            data = json.loads(line[6:])
+        elif line == '' and event is not None:
+            return event, data
+
+
+@pytest.fixture
+def events_cfg(tmp_path, cfg, monkeypatch):
+    indir = tmp_path / 'fixed_in'
+    indir.mkdir()
+    cfg.set('server', 'in_path', str(indir))
+    cfg.set('server', 'out_path', str(tmp_path))
+    cfg.set('server', 'events_interval', '0.1')
+    cfg.set('server', 'devices_interval', '60')
+    return indir
+
+
+def test_events_push_changes(events_cfg, http_server, tmp_path):
+    conn = http.client.HTTPConnection('127.0.0.1', http_server, timeout=10)
+    try:
+        conn.request('GET', '/events')
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert resp.getheader('Content-type') == 'text/event-stream'
+
+        events = dict([_read_event(resp), _read_event(resp)])
+        assert events['mount']['changed']['none']['state'] == 'mounted'
+        assert events['mount']['removed'] == []
+        assert 'cpu' in events['sysinfo']
+
+        _request(http_server, 'POST', f'/import?a=start&p={events_cfg}&o={tmp_path / "o"}')
+        while True:
+            event, data = _read_event(resp)
+            if event == 'mount' and data['changed']['none']['state'] == 'done':
+                break
+    finally:
+        conn.close()
+
+
+def test_events_snapshot_shared_by_clients(events_cfg, http_server, monkeypatch):
+    calls = []
+    mount_list = server.PhotoImporterServer.mount_list
+
+    def counted(self):
+        calls.append(1)
+        return mount_list(self)
+
+    monkeypatch.setattr(server.PhotoImporterServer, 'mount_list', counted)
+    time.sleep(0.2)
+    assert not calls  # nothing is computed without clients
+
+    conns = []
+    try:
+        for _ in range(2):
+            conn = http.client.HTTPConnection('127.0.0.1', http_server, timeout=10)
+            conns.append(conn)
+            conn.request('GET', '/events')
+            resp = conn.getresponse()
+            events = dict([_read_event(resp), _read_event(resp)])
+            assert events['mount']['changed']['none']['state'] == 'mounted'
+
+        # One snapshot per subscription, none while idle
+        assert len(calls) <= 2
+        time.sleep(0.3)
+        assert len(calls) <= 2
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+# --- folder size cache ---
+
+
+def test_folder_size_shared_computation(monkeypatch):
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_size(path):
+        calls.append(path)
+        started.set()
+        release.wait(5)
+        return 42
+
+    monkeypatch.setattr(server.scanner, 'folder_size', slow_size)
+    fs = server.FolderSize(60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fs.get('/in'))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    started.wait(5)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == [42, 42, 42]
+    assert calls == ['/in']
+    assert fs.get('/in') == 42
+    assert calls == ['/in']
+
+
+def test_folder_size_stale_value_while_recomputing(monkeypatch):
+    sizes = iter([1, 2])
+    done = threading.Event()
+
+    def size(path):
+        res = next(sizes)
+        if res == 2:
+            done.set()
+        return res
+
+    monkeypatch.setattr(server.scanner, 'folder_size', size)
+    fs = server.FolderSize(60)
+    assert fs.get('/in') == 1
+
+    fs.invalidate()
+    assert fs.get('/in') == 1  # outdated, recomputed in background
+    assert done.wait(5)
+    for _ in range(100):
+        if fs.get('/in') == 2:
+            break
+        time.sleep(0.01)
+    assert fs.get('/in') == 2
+
+
+def test_folder_size_error_not_cached(monkeypatch):
+    def broken(path):
+        raise OSError('broken')
+
+    monkeypatch.setattr(server.scanner, 'folder_size', broken)
+    fs = server.FolderSize(60)
+    with pytest.raises(OSError):
+        fs.get('/in')
+
+    monkeypatch.setattr(server.scanner, 'folder_size', lambda path: 7)
+    assert fs.get('/in') == 7
+
+
+# --- devices monitor ---
+
+
+def test_folder_size_invalidated_when_import_finishes(tmp_path, cfg, fake_exiftool, monkeypatch):
+    indir = tmp_path / 'in'
+    indir.mkdir()
+    cfg.set('server', 'host', '127.0.0.1')
+    cfg.set('server', 'port', '0')
+    computed = []
+
+    def size(path):
+        computed.append(path)
+        return 1
+
+    monkeypatch.setattr(server.scanner, 'folder_size', size)
+    srv = server.PhotoImporterServer(cfg)
+    try:
+        assert srv.folder_size(str(indir)) == 1
+        srv.import_start(str(indir), str(tmp_path / 'out'))
+        deadline = time.monotonic() + 5
+        # Without import_done, the finished import invalidates the size
+        while len(computed) < 2 and time.monotonic() < deadline:
+            srv.folder_size(str(indir))
+            time.sleep(0.01)
+        assert len(computed) == 2
+    finally:
+        srv.server_close()
+
+
+def test_mount_list_reads_monitor_snapshot(tmp_path, cfg, monkeypatch):
+    mnt = tmp_path / 'card'
+    mnt.mkdir()
+    cfg.set('server', 'host', '127.0.0.1')
+    cfg.set('server', 'port', '0')
+    cfg.set('server', 'devices_interval', '60')
+    probes = []
+
+    def probe():
+        probes.append(1)
+        return {'sdb1': {'dev_path': '/dev/sdb1', 'mount_path': str(mnt), 'read_only': False}}
+
+    monkeypatch.setattr(server.devices, 'probe', probe)
+    monkeypatch.setattr(server.subprocess, 'Popen', _RecPopen)
+    srv = server.PhotoImporterServer(cfg)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert len(probes) == 1  # the snapshot taken on start
+        for _ in range(3):
+            status, _, body = _request(srv.server_port, 'GET', '/mount?a=list')
+            assert status == 200
+            assert json.loads(body)['sdb1']['path'] == str(mnt)
+        assert len(probes) == 1
+
+        # Mount commands refresh the snapshot once they are done
+        status, _, _ = _request(srv.server_port, 'POST', '/mount?a=umount&d=sdb1')
+        assert status == 200
+        assert len(probes) == 2
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        thread.join()
+
+
+def test_auto_import_on_mount(tmp_path, cfg, fake_exiftool, monkeypatch):
+    mnt = tmp_path / 'card'
+    mnt.mkdir()
+    cfg.set('server', 'host', '127.0.0.1')
+    cfg.set('server', 'port', '0')
+    cfg.set('server', 'out_path', str(tmp_path / 'out'))
+    cfg.set('server', 'auto_import', '1')
+    mounted = tmp_path / 'mounted'
+    mounted.mkdir()
+    # Mounted before the server start, so not imported
+    found = {'sda1': {'dev_path': '/dev/sda1', 'mount_path': str(mounted), 'read_only': False}}
+    monkeypatch.setattr(server.devices, 'probe', lambda: dict(found))
+
+    srv = server.PhotoImporterServer(cfg)
+    try:
+        assert srv.import_status(str(mnt)) is None
+        assert srv.import_status(str(mounted)) is None
+
+        found['sdb1'] = {'dev_path': '/dev/sdb1', 'mount_path': '', 'read_only': False}
+        srv.refresh_devices()
+        assert srv.import_status(str(mnt)) is None
+
+        found['sdb1'] = {'dev_path': '/dev/sdb1', 'mount_path': str(mnt), 'read_only': False}
+        srv.refresh_devices()
+        assert srv.devices() == found
+        assert srv.import_status(str(mnt)) is not None
+        assert srv.import_status(str(mounted)) is None
+    finally:
+        srv.server_close()
+
+
+def test_mount_list_queued_import(http_server, tmp_path, monkeypatch):
+    mnt = tmp_path / 'card'
+    mnt.mkdir()
+    monkeypatch.setattr(server.PhotoImporterServer, _DEVICES_ATTR, lambda self: _device(mnt))
+    monkeypatch.setattr(server.scheduler.ImportScheduler, 'position', lambda self, imp: 2)
+
+    _request(http_server, 'POST', f'/import?a=start&p={mnt}&o={tmp_path / "o"}')
+    status, _, body = _request(http_server, 'GET', '/mount?a=list')
+
+    assert status == 200
+    data = json.loads(body)['sdz1']
+    assert data['state'] == 'queued'
+    assert data['queue_position'] == 2
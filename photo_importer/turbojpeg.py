@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# pylint: disable=too-few-public-methods
+
+import ctypes
+import ctypes.util
+import logging
+
+# Lossless transform operations (tjtransform.op)
+TJXOP_HFLIP = 1
+TJXOP_VFLIP = 2
+TJXOP_TRANSPOSE = 3
+TJXOP_TRANSVERSE = 4
+TJXOP_ROT90 = 5
+TJXOP_ROT180 = 6
+TJXOP_ROT270 = 7
+
+# tj3Init handle type
+TJINIT_TRANSFORM = 2
+
+LIBRARY_NAMES = ('turbojpeg', 'libturbojpeg', 'turbojpeg-0')
+
+
+class _Region(ctypes.Structure):
+    _fields_ = [
+        ('x', ctypes.c_int),
+        ('y', ctypes.c_int),
+        ('w', ctypes.c_int),
+        ('h', ctypes.c_int),
+    ]
+
+
+class _Transform(ctypes.Structure):
+    _fields_ = [
+        ('r', _Region),
+        ('op', ctypes.c_int),
+        ('options', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('customFilter', ctypes.c_void_p),
+    ]
+
+
+class TurboJpeg:
+    """In-process lossless JPEG transforms via libturbojpeg tjTransform.
+
+    The libjpeg-turbo 3 API is used when it is available, its legacy
+    tjTransform wrapper does not copy markers in all versions.
+    """
+
+    def __init__(self, lib):
+        self.__lib = lib
+        self.__v3 = hasattr(lib, 'tj3Transform')
+        if self.__v3:
+            lib.tj3Init.argtypes = [ctypes.c_int]
+            lib.tj3Init.restype = ctypes.c_void_p
+            lib.tj3Destroy.argtypes = [ctypes.c_void_p]
+            lib.tj3Free.argtypes = [ctypes.c_void_p]
+            lib.tj3GetErrorStr.argtypes = [ctypes.c_void_p]
+            lib.tj3GetErrorStr.restype = ctypes.c_char_p
+            lib.tj3Transform.argtypes = [
+                ctypes.c_void_p,
+                ctypes.c_char_p,
+                ctypes.c_size_t,
+                ctypes.c_int,
+                ctypes.POINTER(ctypes.c_void_p),
+                ctypes.POINTER(ctypes.c_size_t),
+                ctypes.POINTER(_Transform),
+            ]
+            return
+        lib.tjInitTransform.restype = ctypes.c_void_p
+        lib.tjDestroy.argtypes = [ctypes.c_void_p]
+        lib.tjFree.argtypes = [ctypes.c_void_p]
+        lib.tjGetErrorStr2.argtypes = [ctypes.c_void_p]
+        lib.tjGetErrorStr2.restype = ctypes.c_char_p
+        lib.tjTransform.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_char_p,
+            ctypes.c_ulong,
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_void_p),
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(_Transform),
+            ctypes.c_int,
+        ]
+
+    def transform(self, data, op):
+        """Return data transformed by op, all markers are copied as is."""
+        lib = self.__lib
+        handle = lib.tj3Init(TJINIT_TRANSFORM) if self.__v3 else lib.tjInitTransform()
+        if not handle:
+            raise SystemError('turbojpeg init failed')
+        dst_buf = ctypes.c_void_p()
+        dst_size = ctypes.c_size_t(0) if self.__v3 else ctypes.c_ulong(0)
+        xform = _Transform(op=op)
+        args = (handle, data, len(data), 1, ctypes.byref(dst_buf), ctypes.byref(dst_size), ctypes.byref(xform))
+        try:
+            if self.__v3:
+                failed = lib.tj3Transform(*args)
+            else:
+                failed = lib.tjTransform(*args, 0)
+            if failed:
+                error = lib.tj3GetErrorStr(handle) if self.__v3 else lib.tjGetErrorStr2(handle)
+                raise SystemError(error.decode('utf-8', 'replace'))
+            return ctypes.string_at(dst_buf, dst_size.value)
+        finally:
+            if dst_buf:
+                (lib.tj3Free if self.__v3 else lib.tjFree)(dst_buf)
+            (lib.tj3Destroy if self.__v3 else lib.tjDestroy)(handle)
+
+
+def load():
+    """Return TurboJpeg instance, or None if libturbojpeg is not available."""
+    for name in LIBRARY_NAMES:
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            return TurboJpeg(ctypes.CDLL(path))
+        except (OSError, AttributeError) as ex:
+            logging.debug('turbojpeg (%s) load failed: %s', path, ex)
+    return None